@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fetch_urls import load_search_spec, create_driver, open_search, collect_item_urls, save_urls
+from wait_utils import recorder
+from config_loader import project_path
+from tracing import start_from_config, finish
+
+# 複数の検索条件をまとめて実行するバッチモード
+# categories.json の "searches" に検索条件のリストを書く（省略した項目は単体実行時の設定を使う）
+#   "searches": [
+#       {"search_keyword": "barbour bedale"},
+#       {"search_keyword": "barbour beaufort", "max_pages": 2}
+#   ],
+#   "batch_sessions": 2
+# ブラウザは batch_sessions 個まで起動し、1つのブラウザで複数の検索を順番に処理する
+
+SPEC_KEYS = ["main_category", "sub_category", "sub_sub_category", "search_keyword", "max_pages", "use_search_url", "bulk_harvest", "limit"]
+
+_local = threading.local()  # スレッドごとのブラウザ
+_drivers = []
+_drivers_lock = threading.Lock()
+_save_lock = threading.Lock()
+
+# このスレッドのブラウザを返す（初回だけ起動し、以降の検索で使い回す）
+def get_driver():
+    if getattr(_local, 'driver', None) is None:
+        _local.driver = create_driver()
+        with _drivers_lock:
+            _drivers.append(_local.driver)
+    return _local.driver
+
+# 検索を1件実行して、結果の概要を返す
+def run_search(number, spec):
+    result = {'number': number, **spec, 'url_count': 0, 'file': None, 'seconds': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        driver = get_driver()
+        open_search(driver, spec)
+        item_urls = collect_item_urls(driver, spec["max_pages"], spec["limit"], spec["bulk_harvest"])
+        with _save_lock:  # 同じファイル名にならないよう保存だけは順番に行う
+            result['file'] = save_urls(item_urls, spec["search_keyword"])
+        result['url_count'] = len(item_urls)
+    except Exception as e:
+        print(f"Error in search #{number} '{spec['search_keyword']}': {e}")
+        result['error'] = str(e)
+        # 壊れたブラウザは使い回さず、次の検索で起動し直す
+        broken_driver, _local.driver = getattr(_local, 'driver', None), None
+        if broken_driver is not None:
+            try:
+                broken_driver.quit()
+            except Exception:
+                pass
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    print(f"[{number}] {spec['search_keyword']}: {result['url_count']}件 / {result['seconds']}秒")
+    return result
+
+def run_batch(specs, sessions):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(sessions, len(specs)))) as executor:
+        results = list(executor.map(run_search, range(1, len(specs) + 1), specs))
+    elapsed = time.perf_counter() - start
+
+    for driver in _drivers:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    return results, elapsed
+
+# 実行結果の概要をJSONに保存する
+def save_summary(results, elapsed, sessions):
+    output_dir = project_path('data', 'runs')
+    os.makedirs(output_dir, exist_ok=True)
+    now = datetime.now().strftime('%Y_%m_%d_%H_%M')
+    file_path = os.path.join(output_dir, f"batch_{now}.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'sessions': sessions,
+            'total_seconds': round(elapsed, 2),
+            'searches': results,
+        }, f, ensure_ascii=False, indent=4)
+    return file_path
+
+def main():
+    config, default_spec = load_search_spec()
+    searches = config.get("searches") or [{}]
+    sessions = config.get("batch_sessions", 2)
+    specs = [{**default_spec, **{key: search[key] for key in SPEC_KEYS if key in search}} for search in searches]
+
+    print(f"{len(specs)}件の検索を最大{sessions}個のブラウザで実行します。")
+    start_from_config(config)
+    results, elapsed = run_batch(specs, sessions)
+    recorder.print_summary()
+    finish(config, "batch_search")
+
+    failed = sum(1 for result in results if result['error'])
+    print(f"完了: {len(results) - failed}件 / 失敗: {failed}件 / 所要時間: {elapsed:.1f}秒")
+    print(f"実行結果を保存しました: {save_summary(results, elapsed, sessions)}")
+
+if __name__ == '__main__':
+    main()
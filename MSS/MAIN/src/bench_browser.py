@@ -0,0 +1,79 @@
+import statistics
+import sys
+import time
+
+import pandas as pd
+from selenium.webdriver.common.by import By
+
+from bench_extract import fixture_urls
+from config_loader import load_config
+from driver_factory import create_driver, page_stats, PROFILES
+from fixture_server import start_fixture_server
+from wait_utils import wait_for_element
+
+# ブラウザのプロファイルごとに、商品ページ1件あたりの通信量と読み込み時間を比較する
+#   standard: 従来通りすべて読み込む / lean: 画像・フォント・動画・外部ドメインを読み込まない
+# 使い方: python bench_browser.py [URLファイル] [件数]
+#   URLファイルを省略すると保存済みの商品ページ（フィクスチャ）を使う。フィクスチャには画像などが
+#   含まれないため、通信量の差を見るには data/urls のファイルを指定して実際のページで測る
+
+# 1ページを開き、価格が表示されるまでの時間と通信量を返す
+def measure_page(driver, url):
+    page_stats(driver)  # 前のページの分を読み捨てる
+    start = time.perf_counter()
+    driver.get(url)
+    try:
+        wait_for_element(driver, (By.CSS_SELECTOR, 'div[data-testid="price"]'), "ベンチマーク")
+    except Exception:
+        pass  # 価格のないページも時間と通信量は数える
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, **page_stats(driver)}
+
+def run_profile(profile, urls, config):
+    driver = create_driver(profile, headless=True, measure=True, config=config)
+    try:
+        return [measure_page(driver, url) for url in urls]
+    finally:
+        driver.quit()
+
+def print_results(profile, results):
+    total_bytes = sum(r['bytes'] for r in results)
+    print(
+        f"{profile:>8}: {len(results)}件 / "
+        f"通信量 平均 {total_bytes / len(results) / 1024:.1f} KB / "
+        f"読み込み 中央値 {statistics.median(r['seconds'] for r in results) * 1000:.0f} ms "
+        f"平均 {statistics.mean(r['seconds'] for r in results) * 1000:.0f} ms / "
+        f"リクエスト 平均 {statistics.mean(r['requests'] for r in results):.1f}件 "
+        f"（ブロック {statistics.mean(r['blocked'] for r in results):.1f}件）"
+    )
+    return total_bytes, sum(r['seconds'] for r in results)
+
+def main():
+    config = load_config()
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    server = None
+    if len(sys.argv) > 1:
+        urls = pd.read_csv(sys.argv[1])['商品URL'].head(count).tolist()
+        print(f"{sys.argv[1]} の {len(urls)}件で計測します。")
+    else:
+        server, base_url = start_fixture_server()
+        urls = fixture_urls(base_url)
+        print(f"フィクスチャ {len(urls)}件で計測します（{base_url}）。")
+
+    try:
+        totals = {}
+        for profile in PROFILES:
+            totals[profile] = print_results(profile, run_profile(profile, urls, config))
+    except Exception as e:
+        print(f"ブラウザを起動できなかったため計測をスキップしました: {e}")
+        return
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    (before_bytes, before_seconds), (after_bytes, after_seconds) = totals['standard'], totals['lean']
+    if before_bytes and before_seconds:
+        print(f"通信量: {(1 - after_bytes / before_bytes) * 100:.0f}% 削減 / 読み込み時間: {(1 - after_seconds / before_seconds) * 100:.0f}% 短縮")
+
+if __name__ == '__main__':
+    main()
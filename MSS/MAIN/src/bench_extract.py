@@ -0,0 +1,77 @@
+import glob
+import os
+import sys
+import time
+
+from fixture_server import start_fixture_server, fixtures_folder
+from http_extractor import extract_product_info_http
+import fetch_product_data
+
+# 保存済みの商品ページを使って、HTTP取得とブラウザ取得の速度を比較する
+# 使い方: python bench_extract.py [繰り返し回数]
+
+COLUMNS = ['name', 'price', 'condition', 'posted_date']
+
+def fixture_urls(base_url):
+    item_files = sorted(glob.glob(os.path.join(fixtures_folder, 'items', '*.html')))
+    return [f"{base_url}/item/{os.path.splitext(os.path.basename(f))[0]}" for f in item_files]
+
+# HTTP取得（取得できないページはNoneのまま数える）
+def run_http(urls, rounds):
+    rows, fallbacks = {}, 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for i, url in enumerate(urls):
+            row = extract_product_info_http(url, i + 1)
+            if row is None:
+                fallbacks += 1
+            else:
+                rows[url] = row
+    return time.perf_counter() - start, rows, fallbacks
+
+# ブラウザ取得（従来の extract_product_info）
+def run_browser(urls, rounds):
+    rows = {}
+    driver = fetch_product_data.create_driver()
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for i, url in enumerate(urls):
+                rows[url] = fetch_product_data.extract_product_info(driver, url, i + 1)
+        return time.perf_counter() - start, rows
+    finally:
+        driver.quit()
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    server, base_url = start_fixture_server()
+    urls = fixture_urls(base_url)
+    pages = len(urls) * rounds
+    print(f"フィクスチャ: {len(urls)}ページ x {rounds}回 ({base_url})")
+
+    http_elapsed, http_rows, fallbacks = run_http(urls, rounds)
+    print(f"HTTP:     {http_elapsed:.2f}秒 / {http_elapsed / pages * 1000:.1f} ms/page / ブラウザ切替 {fallbacks}件")
+
+    try:
+        browser_elapsed, browser_rows = run_browser(urls, rounds)
+    except Exception as e:
+        print(f"ブラウザでの計測をスキップしました: {e}")
+        server.shutdown()
+        return
+
+    print(f"ブラウザ: {browser_elapsed:.2f}秒 / {browser_elapsed / pages * 1000:.1f} ms/page")
+    print(f"速度比: {browser_elapsed / http_elapsed:.1f}倍")
+
+    # 両方で取得できたページの内容が一致するか確認する
+    mismatches = [
+        url for url, row in http_rows.items()
+        if any(row[column] != browser_rows[url][column] for column in COLUMNS)
+    ]
+    print(f"内容の不一致: {len(mismatches)}件")
+    for url in mismatches:
+        print(f"  {url}: HTTP={http_rows[url]} / ブラウザ={browser_rows[url]}")
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
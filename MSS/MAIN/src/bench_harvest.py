@@ -0,0 +1,80 @@
+import sys
+import time
+
+from selenium.webdriver.common.by import By
+
+from fixture_server import start_fixture_server
+import fetch_urls
+
+# 保存済みの検索結果ページを使って、URLの取得方法ごとの通信回数と時間を比較する
+#   従来: アイテムごとに find_element + get_attribute（1件あたり2回の通信）
+#   一括: execute_script 1回でページ内の全リンクを取得
+# 使い方: python bench_harvest.py [必要件数]
+
+# WebDriverへのコマンド送信回数を数える
+class RoundTripCounter:
+    def __init__(self, driver):
+        self.count = 0
+        self._execute = driver.execute
+
+        def counting_execute(*args, **kwargs):
+            self.count += 1
+            return self._execute(*args, **kwargs)
+        driver.execute = counting_execute  # WebElementの操作も driver.execute を通る
+
+    def reset(self):
+        self.count = 0
+
+def open_results(driver, url):
+    driver.get(url)
+    fetch_urls.wait_for_element(driver, fetch_urls.item_locator, "ベンチマーク")
+
+# 全件読み込み済みのページから、取得処理だけの通信回数と時間を測る
+def bench_extraction(driver, counter, url):
+    open_results(driver, url)
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    fetch_urls.collect_item_urls(driver, 1, bulk=True)  # 全件を読み込ませる
+
+    counter.reset()
+    start = time.perf_counter()
+    legacy = [item.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
+              for item in driver.find_elements(*fetch_urls.item_locator)]
+    legacy_time, legacy_trips = time.perf_counter() - start, counter.count
+
+    counter.reset()
+    start = time.perf_counter()
+    bulk = fetch_urls.harvest_item_hrefs(driver)
+    bulk_time, bulk_trips = time.perf_counter() - start, counter.count
+
+    print(f"取得処理のみ（{len(legacy)}件）")
+    print(f"  従来: 通信 {legacy_trips}回 / {legacy_time * 1000:.0f} ms")
+    print(f"  一括: 通信 {bulk_trips}回 / {bulk_time * 1000:.0f} ms（結果一致: {legacy == bulk}）")
+
+# スクロールを含めた1ページ分の取得を測る
+def bench_page(driver, counter, url, label, limit=None, bulk=True):
+    open_results(driver, url)
+    counter.reset()
+    start = time.perf_counter()
+    urls = fetch_urls.collect_item_urls(driver, 1, limit=limit, bulk=bulk)
+    elapsed = time.perf_counter() - start
+    print(f"  {label}: {len(urls)}件 / 通信 {counter.count}回 / {elapsed:.2f}秒")
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    server, base_url = start_fixture_server()
+    url = f"{base_url}/search/results.html"
+
+    driver = fetch_urls.create_driver()
+    counter = RoundTripCounter(driver)
+    try:
+        bench_extraction(driver, counter, url)
+        print("スクロールを含む1ページ分")
+        bench_page(driver, counter, url, "従来", bulk=False)
+        bench_page(driver, counter, url, "一括", bulk=True)
+        bench_page(driver, counter, url, f"一括（{limit}件で打ち切り）", limit=limit, bulk=True)
+    finally:
+        driver.quit()
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from config_loader import load_config, project_path
+from fixture_server import start_fixture_server, get_catalog
+from item_store import ItemStore
+from row_writer import RowWriter
+import fetch_product_data
+import fetch_urls
+import generate_distribution_chart
+
+# オフラインのベンチマーク
+# フィクスチャサーバーの合成ページ（data/urls の商品を元に件数を増やしたもの）を使って、
+# URLの取得・商品情報の取得（HTTP / ブラウザ）・CSVの書き出し・グラフの作成を別々に計測し、
+# 結果を data/bench に保存して基準（baseline.json）と比べる。基準より遅くなった段階があれば終了コード1で終わる
+#
+# 使い方:
+#   python bench_suite.py                  計測して基準と比べる
+#   python bench_suite.py --save-baseline  計測結果を新しい基準にする
+#   ブラウザを起動できない環境では、ブラウザを使う段階（harvest / extract_browser）はスキップする
+
+bench_folder = project_path('data', 'bench')
+baseline_path = os.path.join(bench_folder, 'baseline.json')
+
+STAGES = ['harvest', 'extract_http', 'extract_browser', 'csv_write', 'chart']
+
+class StageSkipped(Exception):
+    pass
+
+# ブラウザを起動する（起動できなければその段階をスキップする）
+def start_driver(create):
+    try:
+        return create()
+    except Exception as e:
+        raise StageSkipped(f"ブラウザを起動できませんでした: {str(e).splitlines()[0] if str(e) else type(e).__name__}")
+
+# 検索結果ページをスクロールしながらURLを集める
+def bench_harvest(context):
+    driver = start_driver(fetch_urls.create_driver)
+    try:
+        driver.get(f"{context['base_url']}/synthetic/search?count={context['harvest_items']}")
+        fetch_urls.wait_for_element(driver, fetch_urls.item_locator, "ベンチマーク")
+        start = time.perf_counter()
+        urls = fetch_urls.collect_item_urls(driver, 1)
+        return time.perf_counter() - start, len(urls)
+    finally:
+        driver.quit()
+
+# ワーカープール（fetch_product_data の scrape_products）で商品ページを取得する
+def run_extract(context, engine, count):
+    tasks = list(enumerate(context['catalog'].item_urls(context['base_url'], count), start=1))
+    rows = []
+    engine_before = fetch_product_data.engine
+    fetch_product_data.engine = engine
+    store = ItemStore(os.path.join(context['work_folder'], f'items_{engine}.db'))  # 本番の items.db は使わない
+    try:
+        start = time.perf_counter()
+        fetch_product_data.scrape_products(tasks, context['workers'], store, rows.append)
+        elapsed = time.perf_counter() - start
+    finally:
+        fetch_product_data.engine = engine_before
+        store.close()
+    failed = sum(1 for row in rows if row['name'] == 'エラー')
+    if failed:
+        print(f"取得できなかった商品があります: {failed}件")
+    return elapsed, rows
+
+def bench_extract_http(context):
+    elapsed, rows = run_extract(context, 'http', context['items'])
+    context['rows'] = sorted(rows, key=lambda row: row['index'])
+    return elapsed, len(rows)
+
+def bench_extract_browser(context):
+    start_driver(fetch_product_data.create_driver).quit()  # 起動できない環境では取得し直しの待ち時間を使わずにスキップする
+    elapsed, rows = run_extract(context, 'selenium', context['browser_items'])
+    return elapsed, len(rows)
+
+# 取得した行を届いた順（バラバラ）に渡して、元の順番で書き出す
+def bench_csv_write(context):
+    rows = context.get('rows')
+    if not rows:
+        raise StageSkipped("extract_http の結果がありません")
+    path = os.path.join(context['work_folder'], 'products.csv')
+    arrival = rows[1::2] + rows[::2]
+    start = time.perf_counter()
+    with RowWriter(path, fmt='csv', batch_size=fetch_product_data.flush_every, order=[row['index'] for row in rows]) as writer:
+        for row in arrival:
+            writer.write(row)
+    context['products_file'] = path
+    return time.perf_counter() - start, writer.count
+
+def bench_chart(context):
+    if 'products_file' not in context:
+        raise StageSkipped("csv_write の結果がありません")
+    start = time.perf_counter()
+    paths = generate_distribution_chart.render_charts(context['products_file'], context['chart_kinds'])
+    return time.perf_counter() - start, len(paths)
+
+BENCH_FUNCTIONS = {
+    'harvest': bench_harvest,
+    'extract_http': bench_extract_http,
+    'extract_browser': bench_extract_browser,
+    'csv_write': bench_csv_write,
+    'chart': bench_chart,
+}
+
+# 各段階を rounds 回ずつ計測し、中央値を結果にする（1回目でスキップになった段階は以降も計測しない）
+def run_stages(stages, context, rounds):
+    results = {}
+    for stage in stages:
+        runs, count = [], 0
+        for _ in range(rounds):
+            try:
+                seconds, count = BENCH_FUNCTIONS[stage](context)
+            except StageSkipped as e:
+                results[stage] = {'skipped': str(e)}
+                break
+            runs.append(seconds)
+        else:
+            seconds = statistics.median(runs)
+            results[stage] = {
+                'seconds': round(seconds, 4),
+                'items': count,
+                'ms_per_item': round(seconds / count * 1000, 4) if count else None,
+                'runs': [round(r, 4) for r in runs],
+            }
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def save_results(result, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+
+# 基準と比べて、1件あたりの時間が tolerance（割合）より遅くなった段階の名前を返す
+def compare(results, results_settings, baseline, tolerance):
+    regressions = []
+    print(f"---- 基準との比較（{baseline.get('created')} / {baseline.get('commit')}、許容 +{tolerance * 100:.0f}%） ----")
+    if baseline.get('settings') != results_settings:
+        print(f"計測の設定が基準と異なります（基準: {baseline.get('settings')}）")
+    for stage, result in results.items():
+        base = baseline['stages'].get(stage)
+        if 'skipped' in result or not base or 'skipped' in base:
+            print(f"{stage:<16} 比較なし")
+            continue
+        if not result['ms_per_item'] or not base['ms_per_item']:
+            continue
+        change = result['ms_per_item'] / base['ms_per_item'] - 1
+        regressed = change > tolerance
+        if regressed:
+            regressions.append(stage)
+        print(f"{stage:<16} {base['ms_per_item']:>10.3f} → {result['ms_per_item']:>10.3f} ms/件 ({change * 100:+.1f}%){'  遅くなりました' if regressed else ''}")
+    return regressions
+
+def print_results(results):
+    print("---- 計測結果 ----")
+    for stage, result in results.items():
+        if 'skipped' in result:
+            print(f"{stage:<16} スキップ: {result['skipped']}")
+        else:
+            print(f"{stage:<16} {result['seconds']:>9.3f}秒 / {result['items']:>6}件 / {result['ms_per_item']:.3f} ms/件")
+
+def parse_args(config):
+    parser = argparse.ArgumentParser(description="合成ページを使ったオフラインのベンチマーク")
+    parser.add_argument('--items', type=int, default=2000, help="HTTPで取得する商品数（CSV・グラフもこの件数）")
+    parser.add_argument('--harvest-items', type=int, default=300, help="検索結果ページの商品数")
+    parser.add_argument('--browser-items', type=int, default=20, help="ブラウザで取得する商品数")
+    parser.add_argument('--workers', type=int, default=fetch_product_data.num_workers, help="商品ページを取得するワーカー数")
+    parser.add_argument('--rounds', type=int, default=3, help="各段階を計測する回数（中央値を使う）")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help="計測する段階")
+    parser.add_argument('--baseline', default=baseline_path, help="比べる基準のファイル")
+    parser.add_argument('--save-baseline', action='store_true', help="計測結果を基準として保存する")
+    parser.add_argument('--tolerance', type=float, default=config.get("bench_tolerance", 0.2),
+                        help="これより遅くなったら失敗にする割合（0.2 = 20%%）")
+    return parser.parse_args()
+
+def main():
+    config = load_config()
+    args = parse_args(config)
+
+    server, base_url = start_fixture_server()
+    catalog = get_catalog()
+    print(f"合成ページ: 元の商品 {len(catalog.seed_ids)}件から {args.items}件（{base_url}）")
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        generate_distribution_chart.output_folder = work_folder  # 本番の data/charts には書き出さない
+        context = {
+            'base_url': base_url,
+            'catalog': catalog,
+            'work_folder': work_folder,
+            'items': args.items,
+            'harvest_items': args.harvest_items,
+            'browser_items': args.browser_items,
+            'workers': args.workers,
+            'chart_kinds': config.get("chart_kinds", ["scatter"]),
+        }
+        stages = [stage for stage in STAGES if stage in args.stages]
+        # グラフはCSVの書き出し結果を、CSVの書き出しはHTTPでの取得結果を使う
+        if 'chart' in stages and 'csv_write' not in stages:
+            stages.insert(stages.index('chart'), 'csv_write')
+        if 'csv_write' in stages and 'extract_http' not in stages:
+            stages.insert(stages.index('csv_write'), 'extract_http')
+        try:
+            results = run_stages(stages, context, max(1, args.rounds))
+        finally:
+            server.shutdown()
+
+    result = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {key: getattr(args, key) for key in ['items', 'harvest_items', 'browser_items', 'workers', 'rounds']},
+        'stages': results,
+    }
+    print_results(results)
+    result_path = os.path.join(bench_folder, f"bench_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.json")
+    save_results(result, result_path)
+    print(f"計測結果を保存しました: {result_path}")
+
+    if args.save_baseline:
+        save_results(result, args.baseline)
+        print(f"基準を保存しました: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("基準がありません。--save-baseline で保存すると次回から比較します。")
+        return
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, result['settings'], baseline, args.tolerance)
+    if regressions:
+        print(f"基準より遅くなった段階があります: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import json
+import os
+
+# 設定ファイルとデータフォルダの場所を、実行したフォルダではなくこのファイルの位置から決める
+# （src 以外のフォルダから実行したり、他のモジュールから import したりしても同じファイルを使う）
+
+base_folder = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+config_path = os.path.join(base_folder, 'config', 'categories.json')
+
+# MSS/MAIN からの相対パスを絶対パスにする（例: project_path('data', 'urls')）
+def project_path(*parts):
+    return os.path.join(base_folder, *parts)
+
+# categories.json を読み込む
+def load_config(path=None):
+    with open(path or config_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
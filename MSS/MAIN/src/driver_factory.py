@@ -0,0 +1,113 @@
+import json
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+from config_loader import load_config
+from tracing import instrument_driver
+
+# ChromeDriverの起動をまとめたモジュール（fetch_urls・fetch_product_data などから共通で使う）
+# 商品ページでは数個の文字しか読まないため、"lean" プロファイルでは画像・動画・フォントと
+# 外部ドメイン（広告・計測タグなど）を読み込まず、DOMができた時点で次の処理へ進む
+#
+# categories.json の設定
+#   "chromedriver_path": ChromeDriverのパス（空なら PATH 上のものを Selenium が探す）
+#   "search_browser_profile": 検索ページ用のプロファイル（"standard" / "lean"）
+#   "item_browser_profile": 商品ページ用のプロファイル
+#   "blocked_domains": 追加で読み込まないドメイン
+#   "page_load_timeout": ページの読み込みを待つ上限（秒）
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# プロファイルごとの設定
+#   block: 画像などを読み込まない / page_load_strategy: "eager" ならDOMの構築が終わった時点で driver.get を返す
+PROFILES = {
+    'standard': {'block': False, 'page_load_strategy': 'normal'},
+    'lean': {'block': True, 'page_load_strategy': 'eager'},
+}
+
+# 読み込まないファイルの種類（DevTools の Network.setBlockedURLs のパターン）
+BLOCKED_RESOURCES = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3',
+]
+
+# 読み込まない外部ドメイン（広告・計測タグ・SNS連携）
+BLOCKED_DOMAINS = [
+    'googletagmanager.com', 'google-analytics.com', 'googlesyndication.com', 'doubleclick.net',
+    'googleadservices.com', 'facebook.net', 'facebook.com', 'connect.facebook.net',
+    'twitter.com', 'criteo.com', 'criteo.net', 'adsrvr.org', 'yahoo.co.jp', 'yimg.jp',
+    'line-scdn.net', 'tiktok.com', 'hotjar.com', 'datadoghq-browser-agent.com', 'sentry.io',
+]
+
+# ブラウザの設定で画像・動画・通知を無効にする（DevToolsのブロックが効かない場合の保険）
+LEAN_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.media_stream': 2,
+    'profile.managed_default_content_settings.notifications': 2,
+    'profile.managed_default_content_settings.plugins': 2,
+}
+
+def blocked_url_patterns(config):
+    domains = BLOCKED_DOMAINS + config.get("blocked_domains", [])
+    return BLOCKED_RESOURCES + [f'*://*.{domain}/*' for domain in domains] + [f'*://{domain}/*' for domain in domains]
+
+# ChromeDriverを起動する
+#   profile: None なら "standard"
+#   measure: True なら通信量を数えるためにパフォーマンスログを有効にする（page_stats で読む）
+def create_driver(profile=None, headless=False, user_agent=None, measure=False, config=None):
+    config = config if config is not None else load_config()
+    profile = profile or 'standard'
+    if profile not in PROFILES:
+        raise ValueError(f"未対応のブラウザプロファイルです: {profile}")
+    settings = PROFILES[profile]
+
+    options = Options()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    if headless:
+        options.add_argument('--headless=new')
+    if user_agent:
+        options.add_argument(f'user-agent={user_agent}')
+    options.page_load_strategy = settings['page_load_strategy']
+    if settings['block']:
+        options.add_experimental_option('prefs', LEAN_PREFS)
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--mute-audio')
+    if measure:
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    driver_path = config.get("chromedriver_path")
+    service = Service(driver_path) if driver_path else Service()
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(config.get("page_load_timeout", 30))  # 読み込みが終わらないページは timeout として扱う
+
+    if settings['block']:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_url_patterns(config)})
+    return instrument_driver(driver)  # 計測が有効なら要素の検索やページの読み込みも記録する
+
+# 検索ページ用のブラウザ
+def create_search_driver(config=None, measure=False):
+    config = config if config is not None else load_config()
+    return create_driver(config.get("search_browser_profile", "standard"), user_agent=USER_AGENT, measure=measure, config=config)
+
+# 商品ページ用のブラウザ
+def create_item_driver(config=None, measure=False):
+    config = config if config is not None else load_config()
+    return create_driver(config.get("item_browser_profile", "lean"), headless=True, measure=measure, config=config)
+
+# 前回呼んでから今までに読み込んだ通信量を返す（measure=True で起動したブラウザのみ）
+#   bytes: 実際に転送したバイト数 / requests: 読み込んだ件数 / blocked: ブロックした件数
+def page_stats(driver):
+    transferred, requests, blocked = 0, 0, 0
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message['method'] == 'Network.loadingFinished':
+            transferred += message['params'].get('encodedDataLength', 0)
+            requests += 1
+        elif message['method'] == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+            blocked += 1
+    return {'bytes': int(transferred), 'requests': requests, 'blocked': blocked}
@@ -1,135 +1,363 @@
-import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
-import os
-import glob
-import json
-import re
-from datetime import datetime  # 現在時刻取得のため
-
-# categories.jsonを読み込む
-with open('../config/categories.json', 'r', encoding='utf-8') as file:
-    config = json.load(file)
-
-# 必須設定を取得
-try:
-    data_count = config["data_count"]  # 取得するデータ数
-    use_latest_file = config["use_latest_file"]  # 最新ファイルを使用するか
-except KeyError as e:
-    print(f"Error: 設定 '{e.args[0]}' が categories.json に存在しません。")
-    exit(1)
-
-# ChromeDriverのパスを指定
-service = Service('C:/chromedriver.exe')
-options = webdriver.ChromeOptions()
-options.add_argument('--headless')
-driver = webdriver.Chrome(service=service, options=options)
-
-# ディレクトリを作成（存在しない場合に作成）
-output_folder = '../data/products'
-os.makedirs(output_folder, exist_ok=True)
-
-# 最新ファイルを参照するかどうかの条件分岐
-if use_latest_file:
-    # 最新のCSVファイルを取得
-    list_of_files = glob.glob('../data/urls/*.csv')
-    if not list_of_files:
-        print("Error: 'data' フォルダー内にCSVファイルが見つかりません。")
-        exit(1)
-    latest_file = max(list_of_files, key=os.path.getmtime)  # 最新のファイルを選択
-    input_file = latest_file
-    print(f"最新のCSVファイルを使用しています: {input_file}")
-else:
-    # ユーザーにファイル名を入力させる
-    input_file = input("元データのCSVファイルの名前を入力してください（拡張子なし）: ").strip()
-    if not input_file.endswith(".csv"):
-        input_file += ".csv"  # 拡張子がなければ追加
-    input_file = f'../data/urls/{input_file}'
-
-    # ファイルの存在確認
-    if not os.path.exists(input_file):
-        print(f"Error: ファイルが見つかりません - {input_file}")
-        exit(1)
-
-# 現在時刻を取得してフォーマット（yyyy_mm_dd_hh_mm）
-current_time = datetime.now().strftime("%Y_%m_%d_%H_%M")
-
-# 出力ファイル名の設定：outputの直後に現在時刻を追加
-input_filename = os.path.basename(input_file)  # 元のファイル名を取得
-output_filename = f"output_{current_time}_{input_filename}"
-output_file = os.path.join(output_folder, output_filename)
-
-# 商品情報を取得する関数
-def extract_product_info(url, index):
-    try:
-        driver.get(url)
-        time.sleep(2)  # ページが完全に読み込まれるまで待機
-
-        # 商品名の取得
-        name = driver.find_element(By.TAG_NAME, 'h1').text if driver.find_elements(By.TAG_NAME, 'h1') else "N/A"
-
-        # 金額の取得 (2つ目のspanを選択)
-        price_element = driver.find_element(By.CSS_SELECTOR, 'div[data-testid="price"]')
-        spans = price_element.find_elements(By.TAG_NAME, 'span')
-        if len(spans) > 1:
-            price = spans[1].text  # 2つ目のspanタグから金額を取得
-        else:
-            price = "N/A"
-
-        # 商品状態の取得
-        condition = driver.find_element(By.CSS_SELECTOR, 'span[data-testid="商品の状態"]').text if driver.find_elements(By.CSS_SELECTOR, 'span[data-testid="商品の状態"]') else "N/A"
-
-        # 日付に関する文字列の取得（「前」を含む<p>要素を検索）
-        posted_date = "日付情報なし"
-        p_elements = driver.find_elements(By.CSS_SELECTOR, 'p.merText.body__5616e150.secondary__5616e150')
-        for p in p_elements:
-            if "前" in p.text:  # 「前」という文字が含まれているかをチェック
-                posted_date = p.text
-                break
-
-        print(f"商品名: {name}")
-        print(f"価格: {price}")
-        print(f"商品の状態: {condition}")
-        print(f"掲載日: {posted_date}")
-        print(f"URL: {url}")
-
-        return {
-            'index': index,
-            'name': name,
-            'price': price,
-            'condition': condition,
-            'posted_date': posted_date,
-            'url': url  # URLをカラムに追加
-        }
-
-    except Exception as e:
-        print(f"Error processing URL {url}: {e}")
-        return {
-            'index': index,
-            'name': 'エラー',
-            'price': 'エラー',
-            'condition': 'エラー',
-            'posted_date': '日付情報なし',
-            'url': url  # URLをエラー時にも追加
-        }
-
-# CSVファイルを読み込む
-df = pd.read_csv(input_file)
-
-# 指定されたデータ数に基づいて商品情報を取得
-urls = df['商品URL'].head(data_count)
-data = []
-
-for i, url in enumerate(urls):
-    data.append(extract_product_info(url, i + 1))  # インデックス番号を追加
-
-# データをCSVとして保存
-product_df = pd.DataFrame(data)
-product_df.to_csv(output_file, index=False)
-
-print(f"商品情報のCSVファイルを作成しました: {output_file}")
-driver.quit()
+import pandas as pd
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException, WebDriverException
+import time
+import os
+import glob
+import queue
+import threading
+import statistics
+import sys
+from datetime import datetime, timedelta  # 現在時刻取得のため
+from http_extractor import extract_product_info_http, get_pool
+from wait_utils import recorder, wait_for_element
+from item_store import ItemStore, extract_item_id
+from row_writer import RowWriter, EXTENSIONS
+from retry_scheduler import RetryScheduler, AdaptiveLimiter, FetchError
+from config_loader import load_config, project_path
+from driver_factory import create_item_driver
+from tracing import span, start_from_config, finish
+
+# categories.jsonを読み込む
+config = load_config()
+
+# 必須設定を取得
+try:
+    data_count = config["data_count"]  # 取得するデータ数
+    use_latest_file = config["use_latest_file"]  # 最新ファイルを使用するか
+except KeyError as e:
+    print(f"Error: 設定 '{e.args[0]}' が categories.json に存在しません。")
+    exit(1)
+
+# 同時に起動するブラウザ数（省略時は1 = 従来通りの逐次処理）
+num_workers = max(1, int(config.get("num_workers", 1)))
+
+# 商品ページの取得方法（"selenium": 常にブラウザで取得 / "http": HTTPで取得し、必要なページだけブラウザで取得）
+engine = config.get("engine", "selenium")
+
+# 保存済みの商品を再取得するまでの時間（時間単位）
+stale_hours = config.get("stale_hours", 24)
+
+# 出力形式（"csv" / "jsonl" / "parquet"）と、ファイルに書き出す間隔（件数）
+output_format = config.get("output_format", "csv")
+flush_every = config.get("flush_every", 10)
+
+# 取得に失敗した商品を取得し直す回数と、待ち時間（秒、1回ごとに2倍にしてランダムに散らす）の初期値と上限
+max_retries = config.get("max_retries", 3)
+retry_base_delay = config.get("retry_base_delay", 2)
+retry_max_delay = config.get("retry_max_delay", 60)
+
+# 1件の取得にこれ以上（秒）かかったら、サイトが混んでいるとみなして同時取得数を減らす
+slow_page_seconds = config.get("slow_page_seconds", 10)
+
+# ChromeDriverを起動する（ワーカーごとに1つずつ作成し、item_browser_profile の設定を使う）
+def create_driver():
+    return create_item_driver(config)
+
+# ディレクトリを作成（存在しない場合に作成）
+output_folder = project_path('data', 'products')
+os.makedirs(output_folder, exist_ok=True)
+urls_folder = project_path('data', 'urls')
+
+# 入力するURLファイルを決定する
+def select_input_file():
+    # 最新ファイルを参照するかどうかの条件分岐
+    if use_latest_file:
+        # 最新のCSVファイルを取得
+        list_of_files = glob.glob(os.path.join(urls_folder, '*.csv'))
+        if not list_of_files:
+            print("Error: 'data' フォルダー内にCSVファイルが見つかりません。")
+            exit(1)
+        latest_file = max(list_of_files, key=os.path.getmtime)  # 最新のファイルを選択
+        print(f"最新のCSVファイルを使用しています: {latest_file}")
+        return latest_file
+
+    # ユーザーにファイル名を入力させる
+    input_file = input("元データのCSVファイルの名前を入力してください（拡張子なし）: ").strip()
+    if not input_file.endswith(".csv"):
+        input_file += ".csv"  # 拡張子がなければ追加
+    input_file = os.path.join(urls_folder, input_file)
+
+    # ファイルの存在確認
+    if not os.path.exists(input_file):
+        print(f"Error: ファイルが見つかりません - {input_file}")
+        exit(1)
+    return input_file
+
+# 出品が削除されたページに表示される文言
+REMOVED_TEXTS = ['この商品は削除されました', '該当する商品は削除されています', 'ページが見つかりません', '商品が見つかりません']
+REMOVED_MARK = '削除済み'  # 削除されていた商品の行の値
+
+# 商品情報を取得する関数（取得できなかった場合はエラーの行を返す）
+def extract_product_info(driver, url, index):
+    try:
+        return fetch_product_row(driver, url, index)
+    except FetchError as e:
+        print(f"Error processing URL {url}: {e}")
+        return removed_row(index, url) if e.kind == 'removed' else error_row(index, url)
+
+# 商品情報を取得する（失敗した場合は理由を分類した FetchError を送出する）
+def fetch_product_row(driver, url, index):
+    try:
+        return read_product_page(driver, url, index)
+    except FetchError:
+        raise
+    except TimeoutException as e:
+        raise FetchError('timeout', e.msg or '')
+    except (NoSuchElementException, StaleElementReferenceException) as e:
+        raise FetchError('no_price', e.msg or '')
+    except WebDriverException as e:
+        raise FetchError('browser', e.msg or '')
+    except Exception as e:
+        raise FetchError('other', str(e))
+
+# 商品ページを開いて各項目を読み取る
+def read_product_page(driver, url, index):
+    driver.get(url)
+    # 価格が表示されるまで待機（表示されなければ上限時間で諦める）
+    if wait_for_element(driver, (By.CSS_SELECTOR, 'div[data-testid="price"]'), "商品ページ", replaces=2) is None:
+        page_text = driver.find_element(By.TAG_NAME, 'body').text
+        if any(text in page_text for text in REMOVED_TEXTS):
+            raise FetchError('removed')
+        raise FetchError('no_price')
+
+    # 商品名の取得
+    name = driver.find_element(By.TAG_NAME, 'h1').text if driver.find_elements(By.TAG_NAME, 'h1') else "N/A"
+
+    # 金額の取得 (2つ目のspanを選択)
+    price_element = driver.find_element(By.CSS_SELECTOR, 'div[data-testid="price"]')
+    spans = price_element.find_elements(By.TAG_NAME, 'span')
+    if len(spans) > 1:
+        price = spans[1].text  # 2つ目のspanタグから金額を取得
+    else:
+        price = "N/A"
+
+    # 商品状態の取得
+    condition = driver.find_element(By.CSS_SELECTOR, 'span[data-testid="商品の状態"]').text if driver.find_elements(By.CSS_SELECTOR, 'span[data-testid="商品の状態"]') else "N/A"
+
+    # 日付に関する文字列の取得（「前」を含む<p>要素を検索）
+    posted_date = "日付情報なし"
+    p_elements = driver.find_elements(By.CSS_SELECTOR, 'p.merText.body__5616e150.secondary__5616e150')
+    for p in p_elements:
+        if "前" in p.text:  # 「前」という文字が含まれているかをチェック
+            posted_date = p.text
+            break
+
+    print(f"[{index}] 商品名: {name}")
+    print(f"[{index}] 価格: {price}")
+    print(f"[{index}] 商品の状態: {condition}")
+    print(f"[{index}] 掲載日: {posted_date}")
+    print(f"[{index}] URL: {url}")
+
+    return {
+        'index': index,
+        'name': name,
+        'price': price,
+        'condition': condition,
+        'posted_date': posted_date,
+        'url': url  # URLをカラムに追加
+    }
+
+# 取得できなかった商品の行
+def error_row(index, url):
+    return {
+        'index': index,
+        'name': 'エラー',
+        'price': 'エラー',
+        'condition': 'エラー',
+        'posted_date': '日付情報なし',
+        'url': url  # URLをエラー時にも追加
+    }
+
+# 出品が削除されていた商品の行（エラー行と違って保存し、stale_hours の間は取得し直さない）
+def removed_row(index, url):
+    return {
+        'index': index,
+        'name': REMOVED_MARK,
+        'price': REMOVED_MARK,
+        'condition': REMOVED_MARK,
+        'posted_date': '日付情報なし',
+        'url': url
+    }
+
+# 保存済みの商品情報から出力する行を作る
+# 掲載日は前回取得したときの「N日前」のままなので、その基準になる前回の取得時刻も書き出す
+def cached_row(index, url, item):
+    return {
+        'index': index,
+        **{column: item[column] for column in ['name', 'price', 'condition', 'posted_date']},
+        'url': url,
+        'fetched_at': item['fetched_at'].isoformat(timespec='seconds'),
+    }
+
+# ワーカー: スケジューラからURLを取り出して商品情報を取得する
+# 入力キューに None（終了の合図）が届き、取得し直す商品もなくなるまで待ち続けるので、URLを取得しながら順に流し込んでもよい
+def worker(worker_id, scheduler, limiter, on_row, latencies, store, stop_event):
+    driver = None  # ブラウザは必要になった時点で起動する
+    try:
+        while not stop_event.is_set():
+            task = scheduler.next_task()
+            if task is scheduler.DONE:
+                break
+            if task is None:
+                continue  # 中断されていないか確認してから待ち直す
+            index, url, attempt = task
+            if not limiter.acquire(stop_event):
+                break
+
+            start = time.perf_counter()
+            kind = None
+            with span("商品ページ", index=index, attempt=attempt) as item_span:
+                try:
+                    row = extract_product_info_http(url, index) if engine == 'http' else None
+                    item_span.set(engine='http' if row is not None else 'browser')
+                    if row is None:
+                        # JavaScriptでの描画が必要なページはSeleniumで取得する
+                        if driver is None:
+                            try:
+                                driver = create_driver()
+                            except Exception as e:
+                                raise FetchError('browser', f"worker {worker_id} could not start: {e}")
+                        if engine == 'http':
+                            print(f"[{index}] HTTPで取得できなかったためブラウザで取得します: {url}")
+                        row = fetch_product_row(driver, url, index)
+                except FetchError as e:
+                    print(f"Error processing URL {url}: {e}")
+                    kind = e.kind
+                    item_span.set(failure=kind)
+            elapsed = time.perf_counter() - start
+            limiter.release(elapsed, congested=kind in ('timeout', 'browser'))
+
+            if kind == 'browser' and driver is not None:
+                # 応答しなくなったブラウザは閉じて、次の取得で起動し直す
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                driver = None
+            if kind is not None:
+                if scheduler.retry(index, url, attempt, kind):
+                    continue
+                # 削除済みは取得し直しても変わらないので保存して次回は飛ばす。それ以外は上限まで取得し直した
+                row = removed_row(index, url) if kind == 'removed' else error_row(index, url)
+            if row['name'] != 'エラー':
+                row['fetched_at'] = datetime.now().isoformat(timespec='seconds')  # 掲載日の「N日前」の基準
+            scheduler.done(attempt, kind is None, kind)
+
+            store.save(row)  # 1件ごとに保存して、中断しても続きから再開できるようにする
+            on_row(row)
+            latencies[worker_id].append(elapsed)
+    finally:
+        if driver is not None:
+            driver.quit()
+
+# スループットとワーカーごとのレイテンシを表示する
+def print_throughput(count, elapsed, latencies):
+    pages_per_sec = count / elapsed if elapsed > 0 else 0.0
+    print(f"処理件数: {count}件 / 所要時間: {elapsed:.1f}秒 / スループット: {pages_per_sec:.2f} pages/sec")
+    for worker_id, values in latencies.items():
+        if not values:
+            continue
+        print(
+            f"ワーカー{worker_id}: {len(values)}件 "
+            f"平均 {statistics.mean(values):.2f}秒 / "
+            f"中央値 {statistics.median(values):.2f}秒 / "
+            f"最大 {max(values):.2f}秒"
+        )
+
+# ワーカーのスレッドを起動する（task_queue には (index, URL) を入れ、最後にワーカー数だけ None を入れる）
+# 戻り値のスケジューラで、取得し直した件数などを確認できる
+def start_workers(task_queue, workers, store, on_row, stop_event):
+    scheduler = RetryScheduler(task_queue, max_retries, retry_base_delay, retry_max_delay)
+    limiter = AdaptiveLimiter(workers, slow_seconds=slow_page_seconds)
+    latencies = {worker_id: [] for worker_id in range(1, workers + 1)}
+    threads = [
+        threading.Thread(target=worker, args=(worker_id, scheduler, limiter, on_row, latencies, store, stop_event), daemon=True)
+        for worker_id in latencies
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, latencies, scheduler
+
+# (index, URL) のリストをワーカープールで処理し、取得した行を1件ずつ on_row に渡す
+# Ctrl-C で中断した場合は、それまでに取得した分だけで終了する
+def scrape_products(tasks, workers, store, on_row):
+    task_queue = queue.Queue()
+    for task in tasks:
+        task_queue.put(task)
+
+    workers = max(1, min(workers, task_queue.qsize()))
+    for _ in range(workers):
+        task_queue.put(None)
+    stop_event = threading.Event()
+
+    start = time.perf_counter()
+    threads, latencies, scheduler = start_workers(task_queue, workers, store, on_row, stop_event)
+    wait_for_workers(threads, stop_event)
+    elapsed = time.perf_counter() - start
+
+    print_throughput(sum(len(values) for values in latencies.values()), elapsed, latencies)
+    scheduler.print_summary()
+    recorder.print_summary()
+
+# ワーカーの終了を待つ
+def wait_for_workers(threads, stop_event):
+    try:
+        # join にタイムアウトを付けて、Ctrl-C を受け付けられるようにする
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        print("中断しました。取得済みの商品は保存されているので、次回は続きから再開します。")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+# URLファイルに対応する出力ファイルのパス（output_<実行時刻>_<URLファイル名>）
+def output_path_for(input_file, current_time=None):
+    current_time = current_time or datetime.now().strftime("%Y_%m_%d_%H_%M")
+    input_filename = os.path.basename(input_file)  # 元のファイル名を取得
+    output_filename = f"output_{current_time}_{os.path.splitext(input_filename)[0]}{EXTENSIONS[output_format]}"
+    return os.path.join(output_folder, output_filename)
+
+# input_file を指定しなければ use_latest_file の設定に従って選ぶ
+def main(input_file=None):
+    input_file = input_file or select_input_file()
+    start_from_config(config)
+
+    # 出力ファイル名の設定：outputの直後に現在時刻（yyyy_mm_dd_hh_mm）を追加
+    output_file = output_path_for(input_file)
+
+    # CSVファイルを読み込む
+    df = pd.read_csv(input_file)
+
+    # 指定されたデータ数に基づいて商品情報を取得
+    urls = df['商品URL'].head(data_count)
+    tasks = [(i + 1, url) for i, url in enumerate(urls)]  # インデックス番号を追加
+
+    # 未取得、または古くなった商品だけを取得する
+    store = ItemStore()
+    max_age = timedelta(hours=stale_hours)
+    pending = [(index, url) for index, url in tasks if store.needs_fetch(extract_item_id(url), max_age)]
+    print(f"{len(tasks)}件中 {len(pending)}件を取得します（{len(tasks) - len(pending)}件は保存済み）。")
+
+    print(f"{len(pending)}件のURLを{num_workers}並列で処理します（取得方法: {engine}）。")
+    get_pool(maxsize=num_workers)
+
+    # 取得した行は元のindex順に並べながら、flush_every 件ごとにファイルへ書き出す
+    with RowWriter(output_file, fmt=output_format, batch_size=flush_every, order=[index for index, _ in tasks]) as writer:
+        pending_indexes = {index for index, _ in pending}
+        for index, url in tasks:
+            if index in pending_indexes:
+                continue
+            writer.write(cached_row(index, url, store.get(extract_item_id(url))))
+
+        scrape_products(pending, num_workers, store, writer.write)
+    store.close()
+    finish(config, "fetch_product_data")
+
+    print(f"商品情報のファイルを作成しました: {output_file}（{writer.count}件）")
+    return output_file
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
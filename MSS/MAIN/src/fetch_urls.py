@@ -1,210 +1,327 @@
-import json
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-import time
-import pandas as pd
-import os
-from datetime import datetime
-
-# JSONファイルからカテゴリー、検索キーワード、ページ数、デバッグモードを読み込む
-with open('../config/categories.json', 'r', encoding='utf-8') as file:
-
-    data = json.load(file)
-    main_category = data["main_category"]
-    sub_category = data["sub_category"]
-    sub_sub_category = data["sub_sub_category"]
-    search_keyword = data["search_keyword"]
-    max_pages = data["max_pages"]  # ページ数をJSONから取得
-    debug_mode = data["debug_mode"]  # デバッグモードをJSONから取得
-
-options = Options()
-options.add_argument('--no-sandbox')
-options.add_argument('--disable-dev-shm-usage')
-options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-
-driver_path = "C:/chromedriver.exe"
-driver = webdriver.Chrome(service=Service(driver_path), options=options)
-
-# メルカリの検索ページを開く
-url = 'https://jp.mercari.com/search'
-driver.get(url)
-wait = WebDriverWait(driver, 10)
-
-# ステップ1: 「絞り込み」ボタンをクリック
-try:
-    filter_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//span[text()='絞り込み']")))
-    filter_button.click()
-    time.sleep(1)
-except Exception as e:
-    print(f"Error clicking filter button: {e}")
-
-# ステップ2: 「おすすめ順」を選択する（デフォルトの選択）
-try:
-    sort_select_element = wait.until(EC.presence_of_element_located((By.NAME, "sortOrder")))
-    sort_select = Select(sort_select_element)
-    sort_select.select_by_value("score:desc")  # おすすめ順を選択
-    time.sleep(1)
-except Exception as e:
-    print(f"Error selecting 'おすすめ順': {e}")
-
-# ステップ3: 「新しい順」を選択する
-try:
-    sort_select.select_by_value("created_time:desc")  # 新しい順を選択
-    time.sleep(1)
-except Exception as e:
-    print(f"Error selecting '新しい順': {e}")
-
-# ステップ4: 「カテゴリー」メニューを開く
-try:
-    category_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//li[@data-testid='category_id']//button[@id='accordion_button']")))
-    category_button.click()
-    time.sleep(1)
-except Exception as e:
-    print(f"Error clicking category accordion button: {e}")
-
-# ステップ5: JSONから読み込んだメインカテゴリーを選択
-try:
-    select_element = wait.until(EC.presence_of_element_located((By.CLASS_NAME, "select__da4764db")))
-    select = Select(select_element)
-    select.select_by_visible_text(main_category)  # JSONファイルから読み込み
-    time.sleep(1)
-except Exception as e:
-    print(f"Error selecting '{main_category}': {e}")
-
-# ステップ6: JSONから読み込んだサブカテゴリーを選択
-try:
-    sub_category_option = wait.until(EC.presence_of_element_located((By.XPATH, f"//option[text()='{sub_category}']")))
-    sub_category_option.click()
-    time.sleep(1)
-except Exception as e:
-    print(f"Error selecting '{sub_category}': {e}")
-
-# ステップ7: JSONから読み込んだサブサブカテゴリーを選択
-try:
-    sub_sub_category_option = wait.until(EC.presence_of_element_located((By.XPATH, f"//option[text()='{sub_sub_category}']")))
-    sub_sub_category_option.click()
-    time.sleep(1)
-except Exception as e:
-    print(f"Error selecting '{sub_sub_category}': {e}")
-
-# ステップ8: 販売状況の「絞り込み」ボタンをクリック
-try:
-    sales_status_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//div[@data-testid='販売状況']//button[@id='accordion_button']")))
-    sales_status_button.click()
-    time.sleep(1)
-except Exception as e:
-    print(f"Error clicking '販売状況' accordion button: {e}")
-
-# ステップ9: 「売り切れのみ」のチェックボックスをクリック
-try:
-    sold_out_checkbox = wait.until(EC.element_to_be_clickable((By.XPATH, "//input[@value='sold_out|trading']")))
-    sold_out_checkbox.click()
-    time.sleep(1)
-except Exception as e:
-    print(f"Error clicking '売り切れのみ' checkbox: {e}")
-
-# ステップ10: 検索ボックスに JSON から読み込んだキーワードを入力
-try:
-    search_box = wait.until(EC.presence_of_element_located((By.XPATH, "//input[@aria-label='検索キーワードを入力']")))
-    search_box.send_keys(search_keyword)  # JSONファイルから読み込み
-    time.sleep(1)
-except Exception as e:
-    print(f"Error entering text into search box: {e}")
-
-# ステップ11: エンターキーを押して検索を実行
-try:
-    search_box.send_keys(Keys.ENTER)
-    time.sleep(3)
-except Exception as e:
-    print(f"Error pressing Enter key: {e}")
-
-# 検索結果のURLを全て取得する処理
-item_urls = []  # URLを保存するリスト
-page = 1  # ページ番号
-
-while page <= max_pages:  # JSONから取得したmax_pagesに従ってループ
-    print(f"Scraping page {page}...")
-    
-    # スクロール処理を追加 - ゆっくりスクロールして読み込みが完了するまで待つ
-    scroll_pause_time = 3  # スクロール後に待つ時間（秒）
-    increment_scroll = 1000  # 一回のスクロール量
-    last_height = driver.execute_script("return document.body.scrollHeight")
-
-    while True:
-        # ページを少しずつスクロール
-        driver.execute_script(f"window.scrollBy(0, {increment_scroll});")
-
-        # スクロール後、商品が読み込まれるまで待機
-        time.sleep(scroll_pause_time)
-
-        # 新しいページの高さを取得
-        new_height = driver.execute_script("return document.body.scrollHeight")
-
-        # ページの高さが変わらない場合、すべてのアイテムが読み込まれたと判断
-        if new_height == last_height:
-            break
-
-        last_height = new_height
-
-    # スクロールが完了したら、500px上にスクロール
-    driver.execute_script("window.scrollBy(0, -500);")
-
-    # 検索結果のアイテムを取得
-    items = driver.find_elements(By.CLASS_NAME, "sc-bcd1c877-2.cvAXgx")
-
-    print(f"Found {len(items)} items on page {page}.")
-
-    # 各アイテムのURLを取得してリストに追加
-    for item in items:
-        try:
-            item_url = item.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
-            item_urls.append(item_url)
-        except Exception as e:
-            print(f"Error retrieving item URL: {e}")
-
-    # 次へボタンをクリックして次のページを読み込む
-    try:
-        next_button = driver.find_element(By.XPATH, "//a[contains(text(), '次へ')]")
-        next_button.click()
-        time.sleep(3)  # 次のページが読み込まれるまで待機
-        page += 1
-    except Exception:
-        print("No more pages found or error clicking the next page button.")
-        break
-
-# デバッグモードでなければブラウザを自動で閉じる
-if not debug_mode:
-    driver.quit()
-    print("ブラウザを閉じました。")
-else:
-    print("デバッグモード: 手動でブラウザを閉じてください。")
-    try:
-        # 手動で停止させるために無限ループを設定
-        while True:
-            time.sleep(10)
-    except KeyboardInterrupt:
-        print("デバッグモードを終了しました。")
-
-# 現在の日時を取得し、yyyy,mm,dd,hh,mm形式にフォーマット
-now = datetime.now().strftime('%Y_%m_%d_%H_%M')
-
-# ディレクトリを作成（存在しない場合のみ）
-output_dir = '../data/urls'
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir, exist_ok=True)
-
-# ファイル名を検索キーワードと現在の日時を合わせた形式にする
-file_name = f"{search_keyword}_{now}.csv"
-file_path = os.path.join(output_dir, file_name)
-
-# 取得したURLをCSVファイルに保存
-df = pd.DataFrame(item_urls, columns=['商品URL'])
-df.to_csv(file_path, index=False, encoding='utf-8-sig')
-
-print(f"取得したURL数: {len(item_urls)}")
-print(f"データが '{file_path}' に保存されました。")
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select
+from selenium.webdriver.common.keys import Keys
+import time
+import pandas as pd
+import os
+from datetime import datetime
+from wait_utils import recorder, wait_for_element, wait_for_count_growth, wait_for_staleness
+from search_url import build_search_url, lookup_category_id, learn_category_id
+from config_loader import load_config, project_path, config_path
+from driver_factory import create_search_driver
+from tracing import span, start_from_config, finish
+
+# JSONファイルからカテゴリー、検索キーワード、ページ数、デバッグモードを読み込む
+def load_search_spec(path=config_path):
+    data = load_config(path)
+    return data, {
+        "main_category": data["main_category"],
+        "sub_category": data["sub_category"],
+        "sub_sub_category": data["sub_sub_category"],
+        "search_keyword": data["search_keyword"],
+        "max_pages": data["max_pages"],  # ページ数をJSONから取得
+        "use_search_url": data.get("use_search_url", True),  # 検索URLを直接開くか
+        "bulk_harvest": data.get("bulk_harvest", True),  # リンクをまとめて取得するか
+        "limit": data.get("data_count") if data.get("bulk_harvest", True) else None,  # 商品情報を取得する件数だけ集める
+    }
+
+# ChromeDriverを起動する（search_browser_profile の設定を使う）
+def create_driver():
+    return create_search_driver()
+
+# 検索結果のアイテム
+ITEM_SELECTOR = ".sc-bcd1c877-2.cvAXgx"
+item_locator = (By.CSS_SELECTOR, ITEM_SELECTOR)
+
+# ページ内の全アイテムのリンクを1回の execute_script でまとめて取得する
+HARVEST_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0]), item => {
+    const link = item.querySelector('a');
+    return link ? link.href : null;
+}).filter(href => href);
+"""
+
+def harvest_item_hrefs(driver):
+    return driver.execute_script(HARVEST_SCRIPT, ITEM_SELECTOR)
+
+# 検索ページを開き、絞り込み条件とキーワードを設定して検索する
+# 同じブラウザで続けて別の検索をしてもよい（毎回検索ページから開き直す）
+def apply_filters(driver, spec):
+    main_category = spec["main_category"]
+    sub_category = spec["sub_category"]
+    sub_sub_category = spec["sub_sub_category"]
+    search_keyword = spec["search_keyword"]
+
+    # メルカリの検索ページを開く
+    url = 'https://jp.mercari.com/search'
+    driver.get(url)
+
+    # ステップ1: 「絞り込み」ボタンをクリック
+    with span("ステップ1"):
+        try:
+            filter_button = wait_for_element(driver, (By.XPATH, "//span[text()='絞り込み']"), "ステップ1", clickable=True, replaces=1)
+            filter_button.click()
+        except Exception as e:
+            print(f"Error clicking filter button: {e}")
+
+    # ステップ2: 「おすすめ順」を選択する（デフォルトの選択）
+    with span("ステップ2"):
+        try:
+            sort_select_element = wait_for_element(driver, (By.NAME, "sortOrder"), "ステップ2", replaces=1)
+            sort_select = Select(sort_select_element)
+            sort_select.select_by_value("score:desc")  # おすすめ順を選択
+        except Exception as e:
+            print(f"Error selecting 'おすすめ順': {e}")
+
+    # ステップ3: 「新しい順」を選択する
+    with span("ステップ3"):
+        try:
+            sort_select.select_by_value("created_time:desc")  # 新しい順を選択
+            # 並び順が反映されるまで待つ
+            wait_for_element(driver, (By.CSS_SELECTOR, "select[name='sortOrder'] option[value='created_time:desc']:checked"), "ステップ3", replaces=1)
+        except Exception as e:
+            print(f"Error selecting '新しい順': {e}")
+
+    # ステップ4: 「カテゴリー」メニューを開く
+    with span("ステップ4"):
+        try:
+            category_button = wait_for_element(driver, (By.XPATH, "//li[@data-testid='category_id']//button[@id='accordion_button']"), "ステップ4", clickable=True, replaces=1)
+            category_button.click()
+        except Exception as e:
+            print(f"Error clicking category accordion button: {e}")
+
+    # ステップ5: JSONから読み込んだメインカテゴリーを選択
+    with span("ステップ5"):
+        try:
+            select_element = wait_for_element(driver, (By.CLASS_NAME, "select__da4764db"), "ステップ5", replaces=1)
+            select = Select(select_element)
+            select.select_by_visible_text(main_category)  # JSONファイルから読み込み
+        except Exception as e:
+            print(f"Error selecting '{main_category}': {e}")
+
+    # ステップ6: JSONから読み込んだサブカテゴリーを選択
+    with span("ステップ6"):
+        try:
+            sub_category_option = wait_for_element(driver, (By.XPATH, f"//option[text()='{sub_category}']"), "ステップ6", replaces=1)
+            sub_category_option.click()
+        except Exception as e:
+            print(f"Error selecting '{sub_category}': {e}")
+
+    # ステップ7: JSONから読み込んだサブサブカテゴリーを選択
+    with span("ステップ7"):
+        try:
+            sub_sub_category_option = wait_for_element(driver, (By.XPATH, f"//option[text()='{sub_sub_category}']"), "ステップ7", replaces=1)
+            sub_sub_category_option.click()
+        except Exception as e:
+            print(f"Error selecting '{sub_sub_category}': {e}")
+
+    # ステップ8: 販売状況の「絞り込み」ボタンをクリック
+    with span("ステップ8"):
+        try:
+            sales_status_button = wait_for_element(driver, (By.XPATH, "//div[@data-testid='販売状況']//button[@id='accordion_button']"), "ステップ8", clickable=True, replaces=1)
+            sales_status_button.click()
+        except Exception as e:
+            print(f"Error clicking '販売状況' accordion button: {e}")
+
+    # ステップ9: 「売り切れのみ」のチェックボックスをクリック
+    with span("ステップ9"):
+        try:
+            sold_out_checkbox = wait_for_element(driver, (By.XPATH, "//input[@value='sold_out|trading']"), "ステップ9", clickable=True, replaces=1)
+            sold_out_checkbox.click()
+        except Exception as e:
+            print(f"Error clicking '売り切れのみ' checkbox: {e}")
+
+    # ステップ10: 検索ボックスに JSON から読み込んだキーワードを入力
+    with span("ステップ10"):
+        try:
+            search_box = wait_for_element(driver, (By.XPATH, "//input[@aria-label='検索キーワードを入力']"), "ステップ10", replaces=1)
+            search_box.send_keys(search_keyword)  # JSONファイルから読み込み
+        except Exception as e:
+            print(f"Error entering text into search box: {e}")
+
+    # ステップ11: エンターキーを押して検索を実行
+    with span("ステップ11"):
+        try:
+            search_box.send_keys(Keys.ENTER)
+            # 検索結果のアイテムが表示されるまで待つ
+            wait_for_element(driver, item_locator, "ステップ11", replaces=3)
+        except Exception as e:
+            print(f"Error pressing Enter key: {e}")
+
+# 検索結果ページを開く
+# カテゴリーIDが分かっていれば検索URLを1回開くだけで済ませ、分からなければ画面操作で絞り込んでIDを覚える
+def open_search(driver, spec):
+    category_id = lookup_category_id(spec) if spec.get("use_search_url", True) else None
+    if category_id is None:
+        with span("絞り込み"):
+            apply_filters(driver, spec)
+        learn_category_id(spec, driver.current_url)
+        return
+
+    search_url = build_search_url(spec["search_keyword"], category_id)
+    print(f"検索URLを開きます: {search_url}")
+    with span("検索URL"):
+        driver.get(search_url)
+        wait_for_element(driver, item_locator, "検索URL")
+
+# 検索結果のURLを全て取得する処理
+# bulk=True ならページ内のリンクを execute_script 1回でまとめて取得し、ページをまたいで重複を除く
+# limit を指定すると、その件数に達した時点でスクロールとページ送りをやめる
+# on_url を指定すると、新しいURLを見つけるたびに呼ぶ（全ページの取得を待たずに次の処理へ流せる）
+def collect_item_urls(driver, max_pages, limit=None, bulk=True, on_url=None):
+    item_urls = []  # URLを保存するリスト
+    seen = set()  # 取得済みのURL（重複除去用）
+    page = 1  # ページ番号
+
+    # 新しいURLだけを追加し、必要な件数に達したら True を返す
+    def add_urls(hrefs):
+        for href in hrefs:
+            if limit is not None and len(item_urls) >= limit:
+                break
+            if href not in seen:
+                seen.add(href)
+                item_urls.append(href)
+                if on_url is not None:
+                    on_url(href)
+        return limit is not None and len(item_urls) >= limit
+
+    reached = False
+    while page <= max_pages and not reached:  # JSONから取得したmax_pagesに従ってループ
+        print(f"Scraping page {page}...")
+
+        # スクロール処理を追加 - ゆっくりスクロールして読み込みが完了するまで待つ
+        scroll_pause_time = 3  # スクロール後に待つ時間の上限（秒）
+        increment_scroll = 1000  # 一回のスクロール量
+        last_count = len(driver.find_elements(*item_locator))
+        last_position = None
+
+        while True:
+            with span("スクロール", page=page) as scroll_span:
+                # ページを少しずつスクロール
+                driver.execute_script(f"window.scrollBy(0, {increment_scroll});")
+
+                # スクロール後、アイテムの数が増えるか通信が落ち着くまで待機
+                new_count = wait_for_count_growth(driver, ITEM_SELECTOR, last_count, "スクロール", idle_time=1.0, timeout=scroll_pause_time, replaces=scroll_pause_time)
+
+                # 読み込まれた分のリンクを取得し、必要な件数に達したらスクロールをやめる
+                reached = bulk and add_urls(harvest_item_hrefs(driver))
+                scroll_span.set(urls=len(item_urls), grew=bool(new_count))
+            if reached:
+                break
+
+            # アイテムが増えず、ページの下端まで来ていれば（またはそれ以上スクロールできなければ）、すべてのアイテムが読み込まれたと判断
+            # （下端に届いていなければ、続きを読み込ませるためにスクロールを続ける）
+            if not new_count:
+                at_bottom, position = driver.execute_script(
+                    "return [window.scrollY + window.innerHeight >= document.body.scrollHeight - 2, window.scrollY];"
+                )
+                if at_bottom or position == last_position:
+                    break
+                last_position = position
+                continue
+
+            last_count = new_count
+
+        if bulk:
+            # スクロールで取りこぼしたリンクがないよう最後にもう一度まとめて取得
+            if not reached:
+                reached = add_urls(harvest_item_hrefs(driver))
+            print(f"Collected {len(item_urls)} unique items up to page {page}.")
+        else:
+            # スクロールが完了したら、500px上にスクロール
+            driver.execute_script("window.scrollBy(0, -500);")
+
+            # 検索結果のアイテムを取得
+            items = driver.find_elements(*item_locator)
+
+            print(f"Found {len(items)} items on page {page}.")
+
+            # 各アイテムのURLを取得してリストに追加
+            for item in items:
+                try:
+                    item_url = item.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
+                    item_urls.append(item_url)
+                    if on_url is not None:
+                        on_url(item_url)
+                except Exception as e:
+                    print(f"Error retrieving item URL: {e}")
+
+        if reached:
+            print(f"必要な件数（{limit}件）に達したため、URLの取得を終了します。")
+            break
+
+        # 次へボタンをクリックして次のページを読み込む
+        try:
+            first_item = driver.find_elements(*item_locator)[:1]
+            next_button = driver.find_element(By.XPATH, "//a[contains(text(), '次へ')]")
+            next_button.click()
+            # 前のページのアイテムが消え、次のページのアイテムが表示されるまで待機
+            if first_item:
+                wait_for_staleness(driver, first_item[0], "次のページ", replaces=3)
+            wait_for_element(driver, item_locator, "次のページ")
+            page += 1
+        except Exception:
+            print("No more pages found or error clicking the next page button.")
+            break
+
+    return item_urls[:limit] if limit is not None else item_urls
+
+# 取得したURLをCSVファイルに保存し、保存先のパスを返す
+# run_id を指定すると <run_id>.csv に保存する（後の処理が最新ファイルを探さずに済むように）
+def save_urls(item_urls, search_keyword, run_id=None):
+    # 現在の日時を取得し、yyyy,mm,dd,hh,mm形式にフォーマット
+    now = datetime.now().strftime('%Y_%m_%d_%H_%M')
+    stem = run_id or f"{search_keyword}_{now}"
+
+    # ディレクトリを作成（存在しない場合のみ）
+    output_dir = project_path('data', 'urls')
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    # ファイル名を検索キーワードと現在の日時を合わせた形式にする
+    file_name = f"{stem}.csv"
+    file_path = os.path.join(output_dir, file_name)
+
+    # 同じ分に同じキーワードを検索した場合は連番を付けて上書きを防ぐ
+    suffix = 2
+    while os.path.exists(file_path):
+        file_path = os.path.join(output_dir, f"{stem}_{suffix}.csv")
+        suffix += 1
+
+    # 取得したURLをCSVファイルに保存
+    df = pd.DataFrame(item_urls, columns=['商品URL'])
+    df.to_csv(file_path, index=False, encoding='utf-8-sig')
+
+    print(f"取得したURL数: {len(item_urls)}")
+    print(f"データが '{file_path}' に保存されました。")
+    return file_path
+
+def main():
+    config, spec = load_search_spec()
+    debug_mode = config["debug_mode"]  # デバッグモードをJSONから取得
+    start_from_config(config)
+
+    driver = create_driver()
+    open_search(driver, spec)
+    item_urls = collect_item_urls(driver, spec["max_pages"], spec["limit"], spec["bulk_harvest"])
+
+    recorder.print_summary()
+    finish(config, "fetch_urls")
+
+    # デバッグモードでなければブラウザを自動で閉じる
+    if not debug_mode:
+        driver.quit()
+        print("ブラウザを閉じました。")
+    else:
+        print("デバッグモード: 手動でブラウザを閉じてください。")
+        try:
+            # 手動で停止させるために無限ループを設定
+            while True:
+                time.sleep(10)
+        except KeyboardInterrupt:
+            print("デバッグモードを終了しました。")
+
+    save_urls(item_urls, spec["search_keyword"])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from html import escape
+from urllib.parse import urlsplit, parse_qs
+import csv
+import glob
+import os
+import re
+import sys
+import threading
+import zlib
+
+from config_loader import project_path
+from item_store import extract_item_id
+
+# 保存済みの商品ページを返すローカルサーバー（オフラインでの動作確認・ベンチマーク用）
+# /item/<商品ID> → data/fixtures/items/<商品ID>.html
+# /item-data/<商品ID>.json → data/fixtures/item-data/<商品ID>.json
+# 件数を増やしたベンチマーク用に、data/urls の商品を元にした合成ページも返す
+# /synthetic/search?count=<件数> → 検索結果ページ（data/fixtures/search/results.html と同じ作りで、件数だけ増やす）
+# /synthetic/item/<商品ID> → 商品ページ（data/fixtures/items のページと同じ作り）
+
+fixtures_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'fixtures')
+urls_folder = project_path('data', 'urls')
+products_folder = project_path('data', 'products')
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json; charset=utf-8',
+}
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive接続を有効にする
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path.startswith('/synthetic/'):
+            self.send_synthetic()
+            return
+        if path.startswith('/item/'):
+            file_path = os.path.join(fixtures_folder, 'items', os.path.basename(path) + '.html')
+        else:
+            file_path = os.path.join(fixtures_folder, os.path.normpath(path.lstrip('/')))
+
+        if not os.path.isfile(file_path) or not os.path.abspath(file_path).startswith(os.path.abspath(fixtures_folder)):
+            self.send_error(404, "Item not found")  # ステータス行はASCIIのみ
+            return
+
+        with open(file_path, 'rb') as f:
+            body = f.read()
+        self.send_body(body, CONTENT_TYPES.get(os.path.splitext(file_path)[1], 'application/octet-stream'))
+
+    def send_synthetic(self):
+        url = urlsplit(self.path)
+        catalog = get_catalog()
+        if url.path == '/synthetic/search':
+            count = int(parse_qs(url.query).get('count', ['120'])[0])
+            body = catalog.search_page(count)
+        elif url.path.startswith('/synthetic/item/'):
+            body = catalog.item_page(os.path.basename(url.path))
+        else:
+            body = None
+        if body is None:
+            self.send_error(404, "Item not found")
+            return
+        self.send_body(body.encode('utf-8'), CONTENT_TYPES['.html'])
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # リクエストごとのログは出さない
+
+# 合成ページの商品名・価格などは、data/products の取得結果（無ければ data/fixtures/items の商品ページ）から借りる
+ITEM_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <title>{name} by メルカリ</title>
+</head>
+<body>
+    <main>
+        <div data-testid="item-info">
+            <h1 class="heading__a7d91561 page__a7d91561">{name}</h1>
+            <div data-testid="price">
+                <span class="currency">¥</span><span>{price}</span>
+            </div>
+            <div data-testid="item-detail-container">
+                <p class="merText body__5616e150 secondary__5616e150">送料込み</p>
+                <div class="merDisplayRow">
+                    <span>商品の状態</span>
+                    <span data-testid="商品の状態">{condition}</span>
+                </div>
+                <p class="merText body__5616e150 secondary__5616e150">{posted_date}</p>
+            </div>
+        </div>
+    </main>
+</body>
+</html>
+"""
+
+ITEM_CELL = '            <li class="sc-bcd1c877-2 cvAXgx" data-testid="item-cell"><a href="/synthetic/item/{item_id}" data-testid="thumbnail-link"><div class="thumbnail">{item_id}</div></a></li>\n'
+
+GRID_PATTERN = re.compile(r'(<ul id="item-grid">\n).*?(\s*</ul>)', re.S)
+
+# data/urls の商品IDを元に、件数を増やした合成の商品を作る
+#   1巡目は元の商品ID、2巡目以降は元の商品IDの後ろに3桁の番号を付けた商品ID（m\d+ の形のまま）で、
+#   価格と掲載日だけを商品IDから決まる値でずらす（何度作っても同じページになる）
+class SyntheticCatalog:
+    def __init__(self):
+        details = load_seed_details()
+        self.seed_ids = load_seed_ids() or list(details)
+        fallback = list(details.values())
+        self.details = {
+            seed_id: details.get(seed_id) or fallback[i % len(fallback)]
+            for i, seed_id in enumerate(self.seed_ids)
+        }
+        with open(os.path.join(fixtures_folder, 'search', 'results.html'), encoding='utf-8') as f:
+            self.search_template = f.read()
+
+    # 先頭から count 件の商品ID
+    def item_ids(self, count):
+        seeds = len(self.seed_ids)
+        return [
+            self.seed_ids[i % seeds] + (f"{i // seeds:03d}" if i >= seeds else '')
+            for i in range(count)
+        ]
+
+    # 本番の商品URLと同じ形の合成ページのURL
+    def item_urls(self, base_url, count):
+        return [f"{base_url}/synthetic/item/{item_id}" for item_id in self.item_ids(count)]
+
+    # 商品IDに対応する商品情報（作れない商品IDなら None）
+    def item(self, item_id):
+        seed_id, variant = item_id, 0
+        if seed_id not in self.details:
+            seed_id, variant = item_id[:-3], item_id[-3:]
+            if seed_id not in self.details or not variant.isdigit():
+                return None
+            variant = int(variant)
+        detail = self.details[seed_id]
+        if variant == 0:
+            return detail
+        spread = zlib.crc32(item_id.encode()) % 1000 / 1000
+        price = int(detail['price'].replace(',', ''))
+        return {
+            **detail,
+            'price': f"{round(price * (0.85 + 0.3 * spread), -2):,.0f}",
+            'posted_date': f"{1 + int(spread * 23)}時間前",
+        }
+
+    def item_page(self, item_id):
+        item = self.item(item_id)
+        if item is None:
+            return None
+        return ITEM_TEMPLATE.format(**{key: escape(value) for key, value in item.items()})
+
+    def search_page(self, count):
+        cells = ''.join(ITEM_CELL.format(item_id=item_id) for item_id in self.item_ids(count))
+        return GRID_PATTERN.sub(lambda match: match.group(1) + cells + match.group(2), self.search_template, count=1)
+
+# data/urls のURLファイルに含まれる商品ID（重複を除き、ファイル名順）
+def load_seed_ids():
+    seed_ids = {}
+    for path in sorted(glob.glob(os.path.join(urls_folder, '*.csv'))):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                item_id = extract_item_id(row.get('商品URL') or '')
+                if item_id.startswith('m'):
+                    seed_ids[item_id] = True
+    return list(seed_ids)
+
+# 商品ID → 商品名・価格・商品状態・掲載日（価格を読み取れた行だけ）
+def load_seed_details():
+    details = {}
+    for path in sorted(glob.glob(os.path.join(products_folder, '*.csv'))):
+        with open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                if re.fullmatch(r'[0-9,]+', row.get('price') or ''):
+                    details[extract_item_id(row['url'])] = {key: row[key] for key in ['name', 'price', 'condition', 'posted_date']}
+    if not details:
+        from http_extractor import ItemPageParser, normalize_text  # 取得結果が無ければ保存済みの商品ページから読む
+        for path in sorted(glob.glob(os.path.join(fixtures_folder, 'items', '*.html'))):
+            parser = ItemPageParser()
+            with open(path, encoding='utf-8') as f:
+                parser.feed(f.read())
+            if parser.h1_texts and len(parser.price_span_texts) > 1:
+                details[os.path.splitext(os.path.basename(path))[0]] = {
+                    'name': normalize_text(parser.h1_texts[0]),
+                    'price': normalize_text(parser.price_span_texts[1]),
+                    'condition': normalize_text(parser.condition_texts[0]) if parser.condition_texts else 'N/A',
+                    'posted_date': next((normalize_text(t) for t in parser.p_texts if '前' in t), '日付情報なし'),
+                }
+    return details
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = SyntheticCatalog()
+        return _catalog
+
+# バックグラウンドでサーバーを起動し、(サーバー, ベースURL) を返す
+def start_fixture_server(port=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# 本番の商品URLをフィクスチャサーバーのURLに置き換える
+def to_fixture_url(url, base_url):
+    return f"{base_url}/item/{url.rstrip('/').rsplit('/', 1)[-1]}"
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    print(f"フィクスチャサーバーを起動しました: http://127.0.0.1:{port}/item/<商品ID>")
+    print(f"合成ページ: http://127.0.0.1:{port}/synthetic/search?count=<件数>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("フィクスチャサーバーを停止しました。")
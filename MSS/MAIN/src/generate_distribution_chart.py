@@ -1,71 +1,185 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import glob
-import os
-import json
-
-# categories.jsonの読み込み
-with open('../config/categories.json', 'r', encoding='utf-8') as f:
-    config = json.load(f)
-
-# select_manual_fileの設定に基づいて参照するファイルを決定
-data_folder = '../data/products'
-if config.get("select_manual_file", False):  # 設定がTrueなら、ユーザー入力のファイルを使用
-    file_name = input("使用するファイル名を入力してください（拡張子.csvを含む）: ")
-    file_path = os.path.join(data_folder, file_name)
-else:
-    # 設定がFalseなら、data/productsフォルダ内の最新ファイルを使用
-    file_pattern = os.path.join(data_folder, 'output_*.csv')
-    files = glob.glob(file_pattern)
-    if files:
-        file_path = max(files, key=os.path.getmtime)
-    else:
-        print("指定されたフォルダにデータファイルが見つかりません。")
-        exit()
-
-# 指定したファイルが存在するかチェック
-if not os.path.isfile(file_path):
-    print("指定されたファイルが見つかりません。")
-    exit()
-
-# データの読み込み
-data = pd.read_csv(file_path)
-
-# 価格のカンマを削除し、数値型に変換
-data_filtered = data[data['price'].str.replace(',', '').str.isnumeric()]
-data_filtered['price'] = data_filtered['price'].str.replace(',', '').astype(float)
-
-# 商品状態と対応する色
-color_map = {
-    '新品、未使用': 'blue',
-    '未使用に近い': 'cyan',
-    '目立った傷や汚れなし': 'green',
-    'やや傷や汚れあり': 'yellow',
-    '傷や汚れあり': 'orange',
-    '全体的に状態が悪い': 'red'
-}
-
-# カラーマップに基づいて色のリストを作成
-colors = data_filtered['condition'].map(color_map).fillna('gray')
-
-# 保存するフォルダとファイル名の設定
-output_folder = '../data/charts'
-os.makedirs(output_folder, exist_ok=True)
-
-# ファイル名を取得し、拡張子を.pngに変更
-output_filename = os.path.splitext(os.path.basename(file_path))[0] + '.png'
-output_path = os.path.join(output_folder, output_filename)
-
-# グラフの作成と保存
-plt.figure(figsize=(6, 12))
-plt.scatter(data_filtered['index'], data_filtered['price'], c=colors, marker='o', s=20)  # s=20で点の大きさを調整
-plt.xlabel('Index')
-plt.ylabel('Price')
-plt.title('Price Distribution by Condition')
-plt.grid(True)
-
-# ファイル保存
-plt.savefig(output_path)
-plt.close()
-
-print(f"図が保存されました: {output_path}")
+import matplotlib
+matplotlib.use('Agg')  # 画面に表示せずファイルに保存するだけなので非対話型のバックエンドを使う
+import matplotlib.pyplot as plt
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from row_writer import read_rows
+from price_analytics import parse_prices, product_files, CONDITIONS
+from config_loader import load_config, project_path
+
+# 商品状態と対応する色
+color_map = {
+    '新品、未使用': 'blue',
+    '未使用に近い': 'cyan',
+    '目立った傷や汚れなし': 'green',
+    'やや傷や汚れあり': 'yellow',
+    '傷や汚れあり': 'orange',
+    '全体的に状態が悪い': 'red'
+}
+
+# 箱ひげ図の軸ラベル（標準フォントで日本語が表示できないため英語にする）
+condition_labels = {
+    '新品、未使用': 'New',
+    '未使用に近い': 'Like new',
+    '目立った傷や汚れなし': 'Good',
+    'やや傷や汚れあり': 'Fair',
+    '傷や汚れあり': 'Poor',
+    '全体的に状態が悪い': 'Bad'
+}
+
+# グラフの種類ごとのファイル名の末尾と図のサイズ
+CHART_KINDS = {
+    'scatter': ('', (6, 12)),
+    'hist': ('_hist', (8, 6)),
+    'box': ('_box', (8, 6)),
+}
+
+data_folder = project_path('data', 'products')
+output_folder = project_path('data', 'charts')
+
+_figure = None  # プロセスごとに1つの図を使い回す
+
+def get_figure(size):
+    global _figure
+    if _figure is None:
+        _figure = plt.figure(figsize=size)
+    else:
+        _figure.clf()
+        _figure.set_size_inches(size)
+    return _figure
+
+# データの読み込み（書き込み途中のファイルは書き終わった行だけを読む）
+def load_chart_data(file_path):
+    data = read_rows(file_path)
+
+    # 価格のカンマを削除し、数値型に変換（読み取れない価格の行は件数を表示して除外）
+    data = data.assign(price=parse_prices(data['price']))
+    data_filtered = data[data['price'].notna()]
+    if len(data_filtered) < len(data):
+        print(f"価格を読み取れなかった行を除外しました: {len(data) - len(data_filtered)}件 ({os.path.basename(file_path)})")
+    return data_filtered
+
+# 散布図（従来のグラフ）
+def draw_scatter(fig, data_filtered):
+    # カラーマップに基づいて色のリストを作成
+    colors = data_filtered['condition'].map(color_map).fillna('gray')
+
+    ax = fig.add_subplot()
+    ax.scatter(data_filtered['index'], data_filtered['price'], c=colors, marker='o', s=20)  # s=20で点の大きさを調整
+    ax.set_xlabel('Index')
+    ax.set_ylabel('Price')
+    ax.set_title('Price Distribution by Condition')
+    ax.grid(True)
+
+# 価格のヒストグラム
+def draw_hist(fig, data_filtered):
+    ax = fig.add_subplot()
+    ax.hist(data_filtered['price'].astype(float), bins=30, color='steelblue', edgecolor='white')
+    ax.set_xlabel('Price')
+    ax.set_ylabel('Count')
+    ax.set_title('Price Histogram')
+    ax.grid(True)
+
+# 商品状態ごとの箱ひげ図
+def draw_box(fig, data_filtered):
+    conditions = [c for c in CONDITIONS if (data_filtered['condition'] == c).any()]
+    ax = fig.add_subplot()
+    if conditions:
+        boxes = ax.boxplot(
+            [data_filtered.loc[data_filtered['condition'] == c, 'price'].astype(float) for c in conditions],
+            patch_artist=True,
+        )
+        for patch, condition in zip(boxes['boxes'], conditions):
+            patch.set_facecolor(color_map[condition])
+        ax.set_xticks(range(1, len(conditions) + 1), [condition_labels[c] for c in conditions])
+    ax.set_xlabel('Condition')
+    ax.set_ylabel('Price')
+    ax.set_title('Price by Condition')
+    ax.grid(True)
+
+DRAW_FUNCTIONS = {'scatter': draw_scatter, 'hist': draw_hist, 'box': draw_box}
+
+# ファイル名を取得し、拡張子を.pngに変更（散布図以外は種類名を付ける）
+def chart_path(file_path, kind):
+    suffix = CHART_KINDS[kind][0]
+    output_filename = os.path.splitext(os.path.basename(file_path))[0] + suffix + '.png'
+    return os.path.join(output_folder, output_filename)
+
+# グラフが無いか、元データより古ければ True
+def is_stale(file_path, kinds):
+    data_mtime = os.path.getmtime(file_path)
+    for kind in kinds:
+        path = chart_path(file_path, kind)
+        if not os.path.exists(path) or os.path.getmtime(path) < data_mtime:
+            return True
+    return False
+
+# 1つのデータファイルから指定した種類のグラフを作成し、保存先のリストを返す
+def render_charts(file_path, kinds=('scatter',)):
+    data_filtered = load_chart_data(file_path)
+    os.makedirs(output_folder, exist_ok=True)
+
+    output_paths = []
+    for kind in kinds:
+        fig = get_figure(CHART_KINDS[kind][1])
+        DRAW_FUNCTIONS[kind](fig, data_filtered)
+        output_path = chart_path(file_path, kind)
+        fig.savefig(output_path)
+        output_paths.append(output_path)
+    return output_paths
+
+# 全データファイルのグラフをプロセスプールでまとめて作成する
+def render_all(kinds, only_stale=True, workers=None):
+    files = product_files(data_folder)
+    if only_stale:
+        files = [f for f in files if is_stale(f, kinds)]
+    if not files:
+        print("作成が必要なグラフはありません。")
+        return []
+
+    print(f"{len(files)}件のデータファイルからグラフを作成します。")
+    output_paths = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for paths in executor.map(render_charts, files, [kinds] * len(files)):
+            output_paths.extend(paths)
+    return output_paths
+
+# select_manual_fileの設定に基づいて参照するファイルを決定
+def select_file(config):
+    if config.get("select_manual_file", False):  # 設定がTrueなら、ユーザー入力のファイルを使用
+        file_name = input("使用するファイル名を入力してください（拡張子.csvを含む）: ")
+        file_path = os.path.join(data_folder, file_name)
+    else:
+        # 設定がFalseなら、data/productsフォルダ内の最新ファイルを使用（書き込み途中のファイルも対象）
+        files = product_files(data_folder)
+        if files:
+            file_path = max(files, key=os.path.getmtime)
+        else:
+            print("指定されたフォルダにデータファイルが見つかりません。")
+            exit()
+
+    # 指定したファイルが存在するかチェック
+    if not os.path.isfile(file_path):
+        print("指定されたファイルが見つかりません。")
+        exit()
+    return file_path
+
+# file_path を指定すれば、そのファイルのグラフだけを作成する（最新ファイルを探さない）
+def main(file_path=None):
+    # categories.jsonの読み込み
+    config = load_config()
+
+    kinds = config.get("chart_kinds", ["scatter"])
+
+    # chart_batch が True なら全データファイルのグラフをまとめて作成する
+    if file_path is None and config.get("chart_batch", False):
+        output_paths = render_all(kinds, config.get("chart_only_stale", True), config.get("chart_workers"))
+        print(f"図が保存されました: {len(output_paths)}件")
+        return
+
+    for output_path in render_charts(file_path or select_file(config), kinds):
+        print(f"図が保存されました: {output_path}")
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,141 @@
+from html.parser import HTMLParser
+import re
+import urllib3
+
+# 商品ページをHTTPで取得し、Seleniumを使わずに商品情報を取り出すモジュール
+# 取得できない（JavaScriptでの描画が必要な）ページは None を返し、呼び出し側でSeleniumに切り替える
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# 掲載日の<p>要素に付いているクラス（fetch_product_data.py のCSSセレクタと同じ）
+POSTED_DATE_CLASSES = {'merText', 'body__5616e150', 'secondary__5616e150'}
+
+# keep-alive接続をプールして使い回す（スレッドセーフ）
+_pool = None
+
+def get_pool(maxsize=10):
+    global _pool
+    if _pool is None:
+        _pool = urllib3.PoolManager(
+            maxsize=maxsize,
+            block=True,
+            headers={'User-Agent': USER_AGENT, 'Accept-Language': 'ja-JP,ja;q=0.9'},
+            timeout=urllib3.Timeout(connect=5.0, read=10.0),
+            retries=urllib3.Retry(total=2, backoff_factor=0.5),
+        )
+    return _pool
+
+# 空白を詰めて、Seleniumの .text と同じような文字列にする（全角スペースはそのまま残す）
+def normalize_text(text):
+    return re.sub(r'[ \t\n\r\f]+', ' ', text).strip()
+
+# 商品ページのHTMLから必要な要素だけを拾うパーサー
+class ItemPageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.h1_texts = []
+        self.price_span_texts = []
+        self.condition_texts = []
+        self.p_texts = []
+        self.has_price_element = False
+        self._open = []  # 取得中の要素: [タグ名, 格納先リスト, リスト内の位置, 入れ子の深さ]
+        self._price_div_depth = 0  # price の div の中にいる間のdivの深さ
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        testid = attrs.get('data-testid')
+
+        if tag == 'div':
+            if self._price_div_depth:
+                self._price_div_depth += 1
+            elif testid == 'price':
+                self._price_div_depth = 1
+                self.has_price_element = True
+            return
+
+        # 取得中の要素と同じタグが入れ子になっている場合は深さを数える
+        for entry in self._open:
+            if entry[0] == tag:
+                entry[3] += 1
+
+        if tag == 'h1':
+            self._start_capture(tag, self.h1_texts)
+        elif tag == 'span':
+            if self._price_div_depth:
+                self._start_capture(tag, self.price_span_texts)
+            if testid == '商品の状態':
+                self._start_capture(tag, self.condition_texts)
+        elif tag == 'p':
+            classes = set((attrs.get('class') or '').split())
+            if POSTED_DATE_CLASSES <= classes:
+                self._start_capture(tag, self.p_texts)
+
+    def handle_endtag(self, tag):
+        if tag == 'div':
+            if self._price_div_depth:
+                self._price_div_depth -= 1
+            return
+
+        # 深さが0の要素は閉じ、入れ子の要素なら深さを1つ戻す
+        still_open = []
+        for entry in self._open:
+            if entry[0] == tag:
+                if entry[3] == 0:
+                    continue
+                entry[3] -= 1
+            still_open.append(entry)
+        self._open = still_open
+
+    def handle_data(self, data):
+        for _, texts, position, _ in self._open:
+            texts[position] += data
+
+    def _start_capture(self, tag, texts):
+        texts.append('')
+        self._open.append([tag, texts, len(texts) - 1, 0])
+
+# HTTPで商品情報を取得する（Seleniumの extract_product_info と同じ列構成）
+# ページにJavaScriptでの描画が必要な場合や取得に失敗した場合は None を返す
+def extract_product_info_http(url, index):
+    try:
+        response = get_pool().request('GET', url)
+    except Exception as e:
+        print(f"HTTP error for URL {url}: {e}")
+        return None
+
+    if response.status != 200:
+        return None
+
+    parser = ItemPageParser()
+    parser.feed(response.data.decode('utf-8', errors='replace'))
+    parser.close()
+
+    # 商品名と価格が静的HTMLに無ければJavaScriptで描画されるページとみなす
+    if not parser.h1_texts or not parser.has_price_element:
+        return None
+
+    name = normalize_text(parser.h1_texts[0])
+
+    # 金額の取得 (2つ目のspanを選択)
+    if len(parser.price_span_texts) > 1:
+        price = normalize_text(parser.price_span_texts[1])
+    else:
+        price = "N/A"
+
+    condition = normalize_text(parser.condition_texts[0]) if parser.condition_texts else "N/A"
+
+    # 日付に関する文字列の取得（「前」を含む<p>要素を検索）
+    posted_date = "日付情報なし"
+    for text in parser.p_texts:
+        if "前" in text:
+            posted_date = normalize_text(text)
+            break
+
+    return {
+        'index': index,
+        'name': name,
+        'price': price,
+        'condition': condition,
+        'posted_date': posted_date,
+        'url': url
+    }
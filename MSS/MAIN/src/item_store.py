@@ -0,0 +1,73 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from config_loader import project_path
+
+# 取得済みの商品情報を保存するSQLiteデータベース（メルカリの商品ID m\d+ をキーにする）
+# 取得するたびに1件ずつ保存するので、途中で止まっても次回は続きから再開できる
+
+db_path = project_path('data', 'items.db')
+
+ITEM_ID_PATTERN = re.compile(r'/item/(m\d+)')
+
+COLUMNS = ['name', 'price', 'condition', 'posted_date', 'url']
+
+# URLから商品IDを取り出す（見つからなければURLそのものをキーにする）
+def extract_item_id(url):
+    match = ITEM_ID_PATTERN.search(url)
+    return match.group(1) if match else url
+
+class ItemStore:
+    def __init__(self, path=db_path):
+        # ワーカーのスレッドから書き込むため、接続はロックで守って共有する
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " item_id TEXT PRIMARY KEY,"
+                " name TEXT, price TEXT, condition TEXT, posted_date TEXT, url TEXT,"
+                " fetched_at TEXT NOT NULL)"
+            )
+
+    # 保存済みの商品情報を返す（無ければ None）
+    def get(self, item_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, price, condition, posted_date, url, fetched_at FROM items WHERE item_id = ?",
+                (item_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        item = dict(zip(COLUMNS, row[:5]))
+        item['fetched_at'] = datetime.fromisoformat(row[5])
+        return item
+
+    # 未取得、または最後の取得から max_age 以上経った商品なら True
+    def needs_fetch(self, item_id, max_age):
+        item = self.get(item_id)
+        return item is None or datetime.now() - item['fetched_at'] >= max_age
+
+    # 取得した商品情報を保存する（エラー行は保存せず、次回もう一度取得する）
+    # 出品が削除されていた行（'削除済み'）は保存し、新しい商品と同じく stale_hours の間は取得し直さない
+    # 取得時刻は行の fetched_at（無ければ現在時刻）にして、書き出したファイルの行と揃える
+    def save(self, row):
+        if row['name'] == 'エラー':
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO items (item_id, name, price, condition, posted_date, url, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(item_id) DO UPDATE SET"
+                " name = excluded.name, price = excluded.price, condition = excluded.condition,"
+                " posted_date = excluded.posted_date, url = excluded.url, fetched_at = excluded.fetched_at",
+                (extract_item_id(row['url']), row['name'], row['price'], row['condition'],
+                 row['posted_date'], row['url'], row.get('fetched_at') or datetime.now().isoformat(timespec='seconds')),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,217 @@
+import os
+import re
+import statistics
+import sys
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+from config_loader import project_path
+from price_analytics import load_products, latest_items
+
+# 商品名の索引
+# 「Barbour BEDALE ビデイルジャケット 黒 32」「バブアー 別注 ビデイル …」のような表記ゆれのある商品名を正規化し、
+# 文字の3-gramの転置索引で似た商品名の売れた商品（相場）をすばやく探す
+# 同じ商品の再出品と思われるものは相場が偏らないよう1件にまとめる
+# 索引は data/cache に保存し、次回からは追加・更新された商品だけを索引に加える
+#
+# 使い方: python name_index.py "Barbour BEDALE 黒 38" [商品状態]
+
+index_path = project_path('data', 'cache', 'name_index.pkl')
+
+# ブランド名・型名の別表記（ひらがなに揃えた後の表記 → 英語表記）
+ALIASES = {
+    'ばぶあー': 'barbour',
+    'ばーぶぁー': 'barbour',
+    'びでいる': 'bedale',
+    'びゅーふぉーと': 'beaufort',
+    'とらんすぽーと': 'transport',
+    'ぼーだー': 'border',
+    'すぺい': 'spey',
+    'あしゅびー': 'ashby',
+    'いんたーなしょなる': 'international',
+    'びーむす': 'beams',
+    'ゆないてっどあろーず': 'united arrows',
+}
+BRANDS = {'barbour'}
+
+# サイズ（英国サイズの胸囲 30〜50、または「サイズ」の後の S/M/L など）
+SIZE_PATTERN = re.compile(r'(?<![0-9])(3[0-9]|4[0-9]|50)(?![0-9])|さいず\s*(x{0,2}[sml])(?![a-z])')
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+|[ぁ-ゖー]+|[一-龥々〆]+')
+
+KANA_OFFSET = ord('ァ') - ord('ぁ')
+
+# 全角・半角を揃え（NFKC）、小文字にし、カタカナをひらがなにして、別表記を英語表記に置き換える
+def normalize_name(name):
+    text = unicodedata.normalize('NFKC', str(name)).lower()
+    text = ''.join(chr(ord(c) - KANA_OFFSET) if 'ァ' <= c <= 'ヶ' else c for c in text)
+    for alias, canonical in ALIASES.items():
+        text = text.replace(alias, f' {canonical} ')
+    return ' '.join(dict.fromkeys(TOKEN_PATTERN.findall(text)))  # 別表記の置き換えで重なった単語は1つにする
+
+def size_tokens(normalized):
+    return frozenset(number or letters for number, letters in SIZE_PATTERN.findall(normalized))
+
+def trigrams(normalized):
+    padded = f' {normalized} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class NameIndex:
+    def __init__(self):
+        self.docs = {}  # 商品ID → 正規化した商品名・サイズ・価格など
+        self.postings = defaultdict(set)  # 3-gram → 商品IDの集合
+        self._relist_of = None  # 再出品と判定した商品ID → まとめ先の商品ID（必要になった時点で計算する）
+
+    # 商品（latest_items の結果）を索引に加える。新しい商品か、より新しい実行で取得し直した商品だけを処理する
+    def update(self, items):
+        added = 0
+        columns = ['item_id', 'name', 'price', 'condition', 'posted_at', 'run_time', 'url']
+        for item_id, name, price, condition, posted_at, run_time, url in items[columns].itertuples(index=False, name=None):
+            old = self.docs.get(item_id)
+            if old is not None and old['run_time'] >= run_time:
+                continue
+            if old is not None:
+                self._remove(item_id)
+            normalized = normalize_name(name)
+            tokens = normalized.split()
+            doc = {
+                'name': name,
+                'normalized': normalized,
+                'key': ' '.join(sorted(set(tokens))),
+                'brands': frozenset(t for t in tokens if t in BRANDS),
+                'sizes': size_tokens(normalized),
+                'grams': trigrams(normalized),
+                'price': int(price),
+                'condition': None if pd.isna(condition) else str(condition),
+                'posted_at': None if pd.isna(posted_at) else posted_at,
+                'run_time': run_time,
+                'url': url,
+            }
+            self.docs[item_id] = doc
+            for gram in doc['grams']:
+                self.postings[gram].add(item_id)
+            added += 1
+        if added:
+            self._relist_of = None
+        return added
+
+    def _remove(self, item_id):
+        for gram in self.docs.pop(item_id)['grams']:
+            self.postings[gram].discard(item_id)
+
+    # 同じ商品の再出品と思われる商品 → まとめ先の商品ID
+    # 正規化した商品名の単語の組み合わせと商品状態が同じで、価格の差が10%以内なら同じ商品とみなし、
+    # 掲載日時が最も新しいものを残す
+    def relists(self):
+        if self._relist_of is None:
+            groups = defaultdict(list)
+            for item_id, doc in self.docs.items():
+                groups[(doc['key'], doc['condition'])].append(item_id)
+
+            self._relist_of = {}
+            for item_ids in groups.values():
+                if len(item_ids) < 2:
+                    continue
+                item_ids.sort(key=lambda i: (self.docs[i]['posted_at'] or self.docs[i]['run_time']), reverse=True)
+                kept = []
+                for item_id in item_ids:
+                    price = self.docs[item_id]['price']
+                    same = next((k for k in kept if abs(self.docs[k]['price'] - price) <= self.docs[k]['price'] * 0.1), None)
+                    if same is None:
+                        kept.append(item_id)
+                    else:
+                        self._relist_of[item_id] = same
+        return self._relist_of
+
+    # 商品名が似ている売れた商品と、その価格の統計を返す
+    #   condition を指定するとその商品状態だけ、商品名にサイズやブランドがあれば同じもの（相手に無い場合は許可）に絞る
+    def comparables(self, name, condition=None, limit=20, min_similarity=0.3):
+        normalized = normalize_name(name)
+        grams = trigrams(normalized)
+        sizes = size_tokens(normalized)
+        brands = frozenset(t for t in normalized.split() if t in BRANDS)
+        relist_of = self.relists()
+
+        overlaps = Counter()
+        for gram in grams:
+            overlaps.update(self.postings.get(gram, ()))
+
+        matches = []
+        for item_id, overlap in overlaps.items():
+            doc = self.docs[item_id]
+            similarity = overlap / (len(grams) + len(doc['grams']) - overlap)
+            if similarity < min_similarity or item_id in relist_of:
+                continue
+            if condition is not None and doc['condition'] != condition:
+                continue
+            if sizes and doc['sizes'] and not sizes & doc['sizes']:
+                continue
+            if brands and doc['brands'] and not brands & doc['brands']:
+                continue
+            matches.append((similarity, item_id, doc))
+        matches.sort(key=lambda match: match[0], reverse=True)
+
+        prices = sorted(doc['price'] for _, _, doc in matches)
+        return {
+            'query': normalized,
+            'stats': price_stats(prices),
+            'items': [
+                {'item_id': item_id, 'similarity': round(similarity, 2), 'name': doc['name'],
+                 'price': doc['price'], 'condition': doc['condition'], 'url': doc['url']}
+                for similarity, item_id, doc in matches[:limit]
+            ],
+        }
+
+def price_stats(prices):
+    if not prices:
+        return {'count': 0}
+    quartiles = statistics.quantiles(prices, n=4) if len(prices) > 1 else [prices[0]] * 3
+    return {
+        'count': len(prices),
+        'min': prices[0],
+        'p25': quartiles[0],
+        'median': quartiles[1],
+        'p75': quartiles[2],
+        'max': prices[-1],
+        'mean': round(statistics.mean(prices)),
+    }
+
+# 保存済みの索引を読み込み、追加・更新された商品を加えて返す
+# （スクリプトとして実行した場合も import した場合も読めるよう、クラスではなく中身の dict を保存する）
+def load_index(products=None, path=index_path):
+    index = NameIndex()
+    if path and os.path.exists(path):
+        state = pd.read_pickle(path)
+        index.docs = state['docs']
+        index.postings.update(state['postings'])
+    products = load_products() if products is None else products
+    added = index.update(latest_items(products))
+    if path and added:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pd.to_pickle({'docs': index.docs, 'postings': dict(index.postings)}, path)
+    return index
+
+def main():
+    start = time.perf_counter()
+    products = load_products()
+    index = load_index(products)
+    duplicates = int(products['price'].notna().sum()) - len(latest_items(products))
+    print(
+        f"索引: {len(index.docs)}件 / 複数回取得した商品の重複行: {duplicates}件 / "
+        f"再出品とみなした商品: {len(index.relists())}件 / 読み込み {(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+    if len(sys.argv) < 2:
+        return
+
+    start = time.perf_counter()
+    result = index.comparables(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"検索語: {result['query']}（{elapsed:.1f} ms）")
+    print(f"相場: {result['stats']}")
+    for item in result['items']:
+        print(f"  {item['similarity']:.2f}  {item['price']:>8,}円  {item['condition']}  {item['name']}")
+
+if __name__ == '__main__':
+    main()
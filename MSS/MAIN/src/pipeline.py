@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import fetch_urls
+import fetch_product_data
+import generate_distribution_chart
+import price_analytics
+from config_loader import project_path
+from item_store import ItemStore, extract_item_id
+from row_writer import RowWriter
+from wait_utils import recorder
+from tracing import span, start_from_config, finish
+
+# URLの取得 → 商品情報の取得 → グラフ・集計 を1つのプロセスで続けて実行する
+# 検索結果から見つけたURLはサイズ上限付きのキューで商品情報のワーカーへすぐに渡すので、
+# 後のページをスクロールしている間にも商品ページの取得が進む
+# 各段階のファイルは実行ID（<キーワード>_<実行日時>）で結び付け、最新ファイルを探す処理は使わない
+#
+# 使い方: python pipeline.py [--keyword キーワード] [--max-pages N] [--limit N] [--workers N]
+#         python pipeline.py --urls-file ../data/urls/<ファイル>.csv   （URLの取得を省いて続きから実行）
+
+runs_folder = project_path('data', 'runs')
+
+# 取得を途中でやめるときにURLの取得処理を抜けるための例外
+class PipelineStopped(Exception):
+    pass
+
+# 検索ごとの実行ID（URLファイル・商品情報ファイル・グラフのファイル名に使う）
+def new_run_id(search_keyword):
+    return f"{search_keyword}_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}"
+
+class Pipeline:
+    def __init__(self, config, workers, queue_size, limit=None):
+        self.config = config
+        self.limit = limit
+        self.workers = max(1, workers)
+        self.url_queue = queue.Queue(maxsize=max(1, queue_size))
+        self.stop_event = threading.Event()
+        self.store = ItemStore()
+        self.max_age = timedelta(hours=fetch_product_data.stale_hours)
+        self.item_urls = []
+        self.cached = 0
+        self.threads = []
+        self.timings = {}
+
+    # 見つけたURLに番号を振り、保存済みならそのまま書き出し、そうでなければワーカーのキューへ入れる
+    def add_url(self, url):
+        if self.stop_event.is_set():
+            raise PipelineStopped()
+        if self.limit is not None and len(self.item_urls) >= self.limit:
+            return  # 必要な件数を超えた分は取得しない
+        self.item_urls.append(url)
+        index = len(self.item_urls)
+        self.writer.expect(index)
+
+        item_id = extract_item_id(url)
+        if not self.store.needs_fetch(item_id, self.max_age):
+            self.writer.write(fetch_product_data.cached_row(index, url, self.store.get(item_id)))
+            self.cached += 1
+            return
+        self.put((index, url))
+
+    # キューが空くまで待って入れる（ワーカーが全て止まっていたら中断する）
+    def put(self, task):
+        while not self.stop_event.is_set():
+            try:
+                self.url_queue.put(task, timeout=0.5)
+                return
+            except queue.Full:
+                if not any(thread.is_alive() for thread in self.threads):
+                    self.stop_event.set()
+        raise PipelineStopped()
+
+    # 検索結果をスクロールしながらURLを流し込む
+    def harvest(self, spec):
+        driver = fetch_urls.create_driver()
+        try:
+            fetch_urls.open_search(driver, spec)
+            fetch_urls.collect_item_urls(driver, spec["max_pages"], spec["limit"], spec["bulk_harvest"], on_url=self.add_url)
+        finally:
+            driver.quit()
+
+    # 保存済みのURLファイルから流し込む
+    def feed_file(self, urls_file):
+        urls = pd.read_csv(urls_file)['商品URL']
+        for url in urls.head(self.limit) if self.limit else urls:
+            self.add_url(url)
+
+    # URLの取得と商品情報の取得を並行して実行し、商品情報のファイルのパスを返す
+    def run_scrape(self, run_id, produce):
+        output_file = fetch_product_data.output_path_for(f"{run_id}.csv")
+        self.writer = RowWriter(output_file, fmt=fetch_product_data.output_format, batch_size=fetch_product_data.flush_every, order=[])
+        fetch_product_data.get_pool(maxsize=self.workers)
+
+        start = time.perf_counter()
+        self.threads, latencies, scheduler = fetch_product_data.start_workers(
+            self.url_queue, self.workers, self.store, self.writer.write, self.stop_event,
+        )
+        try:
+            produce()
+            self.timings['urls'] = time.perf_counter() - start
+            print(f"URLの取得が終わりました: {len(self.item_urls)}件（うち保存済み {self.cached}件）")
+            for _ in self.threads:
+                self.put(None)
+        except PipelineStopped:
+            print("商品情報のワーカーが停止したため、URLの取得を中断しました。")
+        except KeyboardInterrupt:
+            print("中断しました。取得済みの商品は保存されているので、次回は続きから再開します。")
+            self.stop_event.set()
+        except Exception:
+            self.stop_event.set()  # 終了の合図を待っているワーカーを止める
+            raise
+        finally:
+            fetch_product_data.wait_for_workers(self.threads, self.stop_event)
+            self.writer.close()
+            self.store.close()
+        self.timings['products'] = time.perf_counter() - start
+
+        fetched = sum(len(values) for values in latencies.values())
+        fetch_product_data.print_throughput(fetched, self.timings['products'], latencies)
+        scheduler.print_summary()
+        recorder.print_summary()
+        print(f"商品情報のファイルを作成しました: {output_file}（{self.writer.count}件）")
+        return output_file
+
+    # この実行の商品情報からグラフを作成する
+    def run_charts(self, products_file):
+        start = time.perf_counter()
+        with span("グラフ"):
+            paths = generate_distribution_chart.render_charts(products_file, self.config.get("chart_kinds", ["scatter"]))
+        self.timings['charts'] = time.perf_counter() - start
+        for path in paths:
+            print(f"図が保存されました: {path}")
+        return paths
+
+    # この実行の商品について、商品状態ごとの価格を表示する
+    def run_analytics(self, products_file):
+        start = time.perf_counter()
+        with span("集計"):
+            products = price_analytics.load_products()
+            products = products[products['run_id'] == os.path.basename(products_file)]
+        if products['price'].notna().any():
+            print("---- 商品状態ごとの価格 ----")
+            print(price_analytics.price_quantiles_by_condition(products).to_string())
+        else:
+            print("価格を取得できた商品がないため、集計を省略します。")
+        self.timings['analytics'] = time.perf_counter() - start
+
+# 実行IDごとに、作成したファイルと各段階の所要時間を data/runs に記録する
+def save_manifest(run_id, manifest):
+    os.makedirs(runs_folder, exist_ok=True)
+    path = os.path.join(runs_folder, f"pipeline_{run_id}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    return path
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="URLの取得から商品情報・グラフの作成までをまとめて実行する")
+    parser.add_argument('--keyword', help="検索キーワード（省略時は categories.json の search_keyword）")
+    parser.add_argument('--max-pages', type=int, help="検索結果のページ数（省略時は max_pages）")
+    parser.add_argument('--limit', type=int, help="商品情報を取得する件数（省略時は data_count）")
+    parser.add_argument('--workers', type=int, help="商品情報を取得する並列数（省略時は num_workers）")
+    parser.add_argument('--queue-size', type=int, default=50, help="URLを待たせておく件数の上限")
+    parser.add_argument('--urls-file', help="URLの取得を省き、このURLファイルから商品情報を取得する")
+    parser.add_argument('--no-charts', action='store_true', help="グラフを作成しない")
+    parser.add_argument('--no-analytics', action='store_true', help="価格の集計を表示しない")
+    parser.add_argument('--trace', action='store_true', help="区間ごとの処理時間を記録する（categories.json の trace と同じ）")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    config, spec = fetch_urls.load_search_spec()
+    if args.keyword:
+        spec["search_keyword"] = args.keyword
+    if args.max_pages:
+        spec["max_pages"] = args.max_pages
+    spec["limit"] = args.limit or config["data_count"]
+
+    if args.trace:
+        config["trace"] = True
+    start_from_config(config)
+
+    pipeline = Pipeline(config, args.workers or fetch_product_data.num_workers, args.queue_size, spec["limit"])
+    if args.urls_file:
+        run_id = os.path.splitext(os.path.basename(args.urls_file))[0]
+        urls_file = args.urls_file
+        products_file = pipeline.run_scrape(run_id, lambda: pipeline.feed_file(args.urls_file))
+    else:
+        run_id = new_run_id(spec["search_keyword"])
+        products_file = pipeline.run_scrape(run_id, lambda: pipeline.harvest(spec))
+        urls_file = fetch_urls.save_urls(pipeline.item_urls, spec["search_keyword"], run_id=run_id)
+
+    charts = [] if args.no_charts else pipeline.run_charts(products_file)
+    if not args.no_analytics:
+        pipeline.run_analytics(products_file)
+
+    manifest_path = save_manifest(run_id, {
+        'run_id': run_id,
+        'search': spec,
+        'urls_file': urls_file,
+        'products_file': products_file,
+        'charts': charts,
+        'urls': len(pipeline.item_urls),
+        'cached': pipeline.cached,
+        'timings': {stage: round(seconds, 2) for stage, seconds in pipeline.timings.items()},
+    })
+    print(f"実行ID {run_id} の記録を保存しました: {manifest_path}")
+    finish(config, f"pipeline_{run_id}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import glob
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from row_writer import read_rows, EXTENSIONS
+from config_loader import project_path
+
+# data/products の全ファイルを1つの型付きテーブルにまとめて価格を分析するモジュール
+# 読み込んだ結果は data/cache にキャッシュし、次回からは追加・更新されたファイルだけを読む
+
+data_folder = project_path('data', 'products')
+cache_path = project_path('data', 'cache', 'products.pkl')
+
+# 商品状態（良い順）
+CONDITIONS = [
+    '新品、未使用',
+    '未使用に近い',
+    '目立った傷や汚れなし',
+    'やや傷や汚れあり',
+    '傷や汚れあり',
+    '全体的に状態が悪い',
+]
+
+# 「2時間前」「1日前」などの単位を秒数に換算する
+POSTED_UNITS = {
+    '秒': 1,
+    '分': 60,
+    '時間': 60 * 60,
+    '日': 24 * 60 * 60,
+    'か月': 30 * 24 * 60 * 60,
+    'ヶ月': 30 * 24 * 60 * 60,
+    '年': 365 * 24 * 60 * 60,
+}
+POSTED_PATTERN = r'(\d+)\s*(' + '|'.join(POSTED_UNITS) + r')前'
+
+RUN_TIME_PATTERN = re.compile(r'output_(\d{4}_\d{2}_\d{2}_\d{2}_\d{2})_')
+ITEM_ID_PATTERN = r'/item/(m\d+)'
+
+# 「18,000」「¥18,000」などを整数に変換する（変換できない値は欠損値）
+def parse_prices(prices):
+    digits = prices.astype('string').str.replace(r'[¥,\s]', '', regex=True)
+    return pd.to_numeric(digits.where(digits.str.fullmatch(r'\d+', na=False)), errors='coerce').astype('Int64')
+
+# 「2時間前」などの相対表記を、取得時刻（fetched_at 列が無い古いファイルでは実行時刻）を基準にした絶対時刻に変換する
+def parse_posted_dates(posted_dates, run_times):
+    parts = posted_dates.astype('string').str.extract(POSTED_PATTERN)
+    seconds = pd.to_numeric(parts[0], errors='coerce') * parts[1].map(POSTED_UNITS)
+    return run_times - pd.to_timedelta(seconds, unit='s')
+
+# ファイル名（output_yyyy_mm_dd_hh_mm_...）から実行時刻を取り出す
+def run_time_of(file_path):
+    match = RUN_TIME_PATTERN.search(os.path.basename(file_path))
+    if match:
+        return datetime.strptime(match.group(1), '%Y_%m_%d_%H_%M')
+    return datetime.fromtimestamp(os.path.getmtime(file_path))
+
+# 1ファイル分を型付きのテーブルに変換する
+def load_file(file_path):
+    raw = read_rows(file_path)
+    run_time = pd.Timestamp(run_time_of(file_path))
+    # 保存済みの商品の行は前回の取得時刻が基準なので、実行時刻で読むと掲載日が後ろにずれる
+    fetched_at = run_time
+    if 'fetched_at' in raw:
+        fetched_at = pd.to_datetime(raw['fetched_at'], errors='coerce').fillna(run_time)
+    table = pd.DataFrame({
+        'run_id': os.path.basename(file_path),
+        'run_time': run_time,
+        'index': pd.to_numeric(raw['index'], errors='coerce').astype('Int64'),
+        'name': raw['name'].astype('string'),
+        'price': parse_prices(raw['price']),
+        'condition': raw['condition'].astype('string'),
+        'posted_at': parse_posted_dates(raw['posted_date'], fetched_at),
+        'url': raw['url'].astype('string'),
+    })
+    table['item_id'] = table['url'].str.extract(ITEM_ID_PATTERN, expand=False).fillna(table['url'])
+    return table
+
+def product_files(folder=data_folder):
+    files = []
+    for ext in EXTENSIONS.values():
+        files.extend(glob.glob(os.path.join(folder, f'output_*{ext}')))
+    return sorted(files)
+
+# 全ファイルを読み込む（変更のないファイルはキャッシュから使う）
+def load_products(folder=data_folder, cache=cache_path):
+    cached, mtimes = None, {}
+    if cache and os.path.exists(cache):
+        cached, mtimes = pd.read_pickle(cache)
+
+    files = {os.path.basename(f): f for f in product_files(folder)}
+    current = {name: os.path.getmtime(path) for name, path in files.items()}
+    changed = [name for name, mtime in current.items() if mtimes.get(name) != mtime]
+
+    tables = []
+    if cached is not None:
+        # 削除・更新されたファイルの行はキャッシュから外す
+        keep = set(current) - set(changed)
+        tables.append(cached[cached['run_id'].isin(keep)])
+    tables.extend(load_file(files[name]) for name in changed)
+
+    products = pd.concat(tables, ignore_index=True) if tables else empty_products()
+    conditions = products['condition'].astype('string')
+    products['condition'] = pd.Categorical(conditions.where(conditions.isin(CONDITIONS)), categories=CONDITIONS, ordered=True)
+    products['run_id'] = products['run_id'].astype('category')
+
+    if cache and (changed or set(mtimes) != set(current)):
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        pd.to_pickle((products, current), cache)
+    return products
+
+# ファイルが1つもない場合の空のテーブル
+def empty_products():
+    return pd.DataFrame({
+        'run_id': pd.Series(dtype='string'),
+        'run_time': pd.Series(dtype='datetime64[ns]'),
+        'index': pd.Series(dtype='Int64'),
+        'name': pd.Series(dtype='string'),
+        'price': pd.Series(dtype='Int64'),
+        'condition': pd.Series(dtype='string'),
+        'posted_at': pd.Series(dtype='datetime64[ns]'),
+        'url': pd.Series(dtype='string'),
+        'item_id': pd.Series(dtype='string'),
+    })
+
+# 同じ商品が複数回取得されている場合は最新の実行結果だけを残す（価格が取れた行のみ）
+def latest_items(products):
+    priced = products[products['price'].notna()]
+    return priced.sort_values('run_time').drop_duplicates('item_id', keep='last')
+
+# 商品状態ごとの価格の分位点
+def price_quantiles_by_condition(products, quantiles=(0.1, 0.25, 0.5, 0.75, 0.9)):
+    items = latest_items(products)
+    grouped = items.groupby('condition', observed=True)['price']
+    # 価格のある行が1件もないと unstack の結果に列ができないので、分位点の列をそろえてから名前を付ける
+    table = grouped.quantile(list(quantiles)).unstack().reindex(columns=list(quantiles))
+    table.columns = [f"p{int(q * 100)}" for q in quantiles]
+    table.insert(0, 'count', grouped.size())
+    return table
+
+# 掲載時期ごとの価格の推移（freq は 'D' / 'W' / 'M' など）
+def price_trend(products, freq='W'):
+    items = latest_items(products).dropna(subset=['posted_at'])
+    periods = items['posted_at'].dt.to_period(freq)
+    return items.groupby(periods)['price'].agg(['count', 'median', 'mean'])
+
+# 期間ごとの1日あたりの売れた件数
+# 検索条件が「売り切れのみ」のため、出品中の件数が分からず厳密な売却率は出せない。その代わりに使う指標
+def sales_velocity(products, freq='W'):
+    items = latest_items(products).dropna(subset=['posted_at'])
+    periods = items['posted_at'].dt.to_period(freq)
+    counts = items.groupby([periods, 'condition'], observed=True).size().unstack(fill_value=0)
+    days = pd.Series([(period.end_time - period.start_time).days + 1 for period in counts.index], index=counts.index)
+    return counts.div(days, axis=0)
+
+def main():
+    products = load_products()
+    items = latest_items(products)
+    dropped = int(products['price'].isna().sum())
+    print(f"ファイル数: {products['run_id'].nunique()} / 行数: {len(products)} / 商品数: {len(items)} / 価格を読み取れなかった行: {dropped}")
+
+    print("---- 商品状態ごとの価格 ----")
+    print(price_quantiles_by_condition(products).to_string())
+    print("---- 週ごとの価格の推移 ----")
+    print(price_trend(products).to_string())
+    print("---- 週ごとの1日あたりの売れた件数 ----")
+    print(sales_velocity(products).round(2).to_string())
+
+if __name__ == '__main__':
+    main()
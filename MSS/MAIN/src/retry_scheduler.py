@@ -0,0 +1,141 @@
+import heapq
+import queue
+import random
+import threading
+import time
+
+# 失敗した商品ページを時間を空けて取得し直すためのスケジューラと、
+# サイトが遅くなったときに同時取得数と取得間隔を自動で絞る制御
+#
+# 失敗の種類
+#   timeout:  ページの読み込みが時間内に終わらなかった（取得し直す）
+#   no_price: 価格の要素が表示されなかった（描画が遅れただけのことがあるので取得し直す）
+#   browser:  ブラウザが応答しなくなった（ブラウザを起動し直して取得し直す）
+#   removed:  出品が削除されている（取得し直しても変わらないので諦める）
+
+RETRYABLE = {'timeout', 'no_price', 'browser'}
+
+# 取得に失敗した理由を持つ例外
+class FetchError(Exception):
+    def __init__(self, kind, message=''):
+        super().__init__(f"{kind}: {message}" if message else kind)
+        self.kind = kind
+
+# 入力キュー（(index, URL) と、最後に終了の合図の None）と、取得し直す商品の待ち行列をまとめて扱う
+# 取得し直す商品は「指数的に伸ばした待ち時間 × ランダムな割合」だけ後に取り出す
+class RetryScheduler:
+    def __init__(self, task_queue, max_retries=3, base_delay=2.0, max_delay=60.0):
+        self.task_queue = task_queue
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {'retried': 0, 'recovered': 0, 'failed': {}}
+        self._retries = []  # (取り出せる時刻, 通し番号, (index, URL, 試行回数))
+        self._sequence = 0
+        self._in_flight = 0
+        self._input_closed = False
+        self._lock = threading.Lock()
+
+    DONE = object()  # すべての商品を処理し終えたことを表す
+
+    # 次に取得する (index, URL, 試行回数) を返す
+    # 今すぐ取得できるものがなければ None、すべて終わっていれば DONE を返す
+    def next_task(self, timeout=0.5):
+        with self._lock:
+            if self._retries and self._retries[0][0] <= time.monotonic():
+                self._in_flight += 1
+                return heapq.heappop(self._retries)[2]
+            closed = self._input_closed
+            if closed:
+                if not self._retries and self._in_flight == 0:
+                    return self.DONE
+                wait = min(timeout, self._retries[0][0] - time.monotonic()) if self._retries else timeout
+        if closed:
+            time.sleep(max(0.0, wait))  # 取得し直す商品の時刻か、他のワーカーの結果を待つ
+            return None
+
+        try:
+            task = self.task_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            if task is None:
+                self._input_closed = True  # 終了の合図（以降は取得し直す商品だけを処理する）
+                return None
+            self._in_flight += 1
+        index, url = task
+        return index, url, 0
+
+    # 取得が終わった（成功、または諦めた）ことを知らせる
+    def done(self, attempt, ok, kind=None):
+        with self._lock:
+            self._in_flight -= 1
+            if ok and attempt > 0:
+                self.stats['recovered'] += 1
+            if not ok:
+                self.stats['failed'][kind] = self.stats['failed'].get(kind, 0) + 1
+
+    # 取得し直せる失敗なら待ち行列に入れて True を返す（諦める場合は False）
+    def retry(self, index, url, attempt, kind):
+        if kind not in RETRYABLE or attempt >= self.max_retries:
+            return False
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self._lock:
+            self._sequence += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, self._sequence, (index, url, attempt + 1)))
+            self._in_flight -= 1
+            self.stats['retried'] += 1
+        print(f"[{index}] {kind} のため {delay:.1f}秒後に取得し直します（{attempt + 1}回目）: {url}")
+        return True
+
+    def print_summary(self):
+        failed = ', '.join(f"{kind} {count}件" for kind, count in self.stats['failed'].items()) or 'なし'
+        print(f"取得し直し: {self.stats['retried']}回 / 取得し直して成功: {self.stats['recovered']}件 / 失敗: {failed}")
+
+# 同時に取得する数と取得の間隔を、結果に応じて調整する（AIMD）
+#   成功して速ければ同時取得数を少しずつ増やし、間隔を縮める
+#   タイムアウトやブラウザの異常、遅いページが続けば同時取得数を半分にし、1になったら間隔を広げる
+class AdaptiveLimiter:
+    def __init__(self, max_concurrency, slow_seconds=10.0, max_interval=5.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.interval = 0.0  # 取得を始める間隔（秒）
+        self.slow_seconds = slow_seconds
+        self.max_interval = max_interval
+        self._active = 0
+        self._next_start = 0.0
+        self._last_decrease = float('-inf')
+        self._condition = threading.Condition()
+
+    # 取得を始めてよくなるまで待つ（stop_event がセットされたら False）
+    def acquire(self, stop_event):
+        with self._condition:
+            while not stop_event.is_set():
+                now = time.monotonic()
+                if self._active < int(self.limit) and now >= self._next_start:
+                    self._active += 1
+                    self._next_start = now + self.interval
+                    return True
+                wait = self._next_start - now if self._active < int(self.limit) else 0.5
+                self._condition.wait(timeout=min(max(wait, 0.01), 0.5))
+            return False
+
+    # 取得が終わったら結果を知らせる（congested: タイムアウトなどサイトの混雑を示す失敗だったか）
+    def release(self, seconds, congested=False):
+        with self._condition:
+            self._active -= 1
+            now = time.monotonic()
+            if congested or seconds > self.slow_seconds:
+                # 同じ混雑で何度も絞りすぎないよう、前回減らしてから取得1回分（最低1秒）は間を空ける
+                # 先に同時取得数を減らし、1まで減らしても混んでいれば取得の間隔を広げる
+                if now - self._last_decrease > max(seconds, self.interval, 1.0):
+                    if self.limit >= 2:
+                        self.limit = max(1.0, self.limit / 2)
+                    else:
+                        self.interval = min(self.max_interval, max(0.5, self.interval * 1.5))
+                    self._last_decrease = now
+                    print(f"サイトの応答が遅いため同時取得数を {int(self.limit)} に、間隔を {self.interval:.1f}秒 にします。")
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self.interval = self.interval * 0.8 if self.interval > 0.1 else 0.0
+            self._condition.notify_all()
@@ -0,0 +1,145 @@
+import csv
+import importlib.util
+import io
+import json
+import os
+import threading
+
+import pandas as pd
+
+# 取得した行をまとめて少しずつファイルに書き出すライター
+# batch_size 件ごとにディスクへ書き込むので、途中で止まってもそれまでの行は残る
+
+# fetched_at: 商品ページを取得した時刻（掲載日の「N日前」はこの時刻が基準。保存済みの商品を書き出した行では前回の取得時刻）
+FIELDNAMES = ['index', 'name', 'price', 'condition', 'posted_date', 'url', 'fetched_at']
+
+# 出力形式ごとの拡張子
+EXTENSIONS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+
+class RowWriter:
+    # order に index の並びを渡すと、その順番で書き出す（先に届いた行は順番が来るまで待たせる）
+    def __init__(self, path, fmt='csv', batch_size=20, order=None, fieldnames=FIELDNAMES):
+        if fmt not in EXTENSIONS:
+            raise ValueError(f"未対応の出力形式です: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.fieldnames = fieldnames
+        self.count = 0
+        self._order = list(order) if order is not None else None
+        self._next = 0  # 次に書き出す order の位置
+        self._pending = {}  # 順番待ちの行（index → 行）
+        self._batch = []
+        self._lock = threading.Lock()
+        self._parquet_writer = None
+
+        if fmt == 'parquet':
+            # pyarrow は最初の書き出し（ワーカーのスレッド内）で読み込むので、無ければ取得を始める前にここで止める
+            if importlib.util.find_spec('pyarrow') is None:
+                raise ValueError("Parquetで出力するには pyarrow が必要です（pip install pyarrow）。output_format を \"csv\" か \"jsonl\" にしてください。")
+            self._file = None
+        else:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            if fmt == 'csv':
+                self._csv_writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+                self._csv_writer.writeheader()
+                self._sync()
+
+    # 1行追加する（ワーカーのスレッドから呼んでもよい）
+    def write(self, row):
+        with self._lock:
+            if self._order is None:
+                self._batch.append(row)
+            else:
+                self._pending[row['index']] = row
+                self._release_in_order()
+            if len(self._batch) >= self.batch_size:
+                self._flush_batch()
+
+    # order の末尾に index を追加する（件数が事前に分からず、URLを取得しながら書き出す場合に使う）
+    def expect(self, index):
+        with self._lock:
+            self._order.append(index)
+            self._release_in_order()
+            if len(self._batch) >= self.batch_size:
+                self._flush_batch()
+
+    # 順番待ちの行を残さず書き出してファイルを閉じる（中断で欠けた index は飛ばす）
+    def close(self):
+        with self._lock:
+            for index in sorted(self._pending):
+                self._batch.append(self._pending[index])
+            self._pending.clear()
+            self._flush_batch()
+            if self._file is not None:
+                self._file.close()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _release_in_order(self):
+        while self._next < len(self._order) and self._order[self._next] in self._pending:
+            self._batch.append(self._pending.pop(self._order[self._next]))
+            self._next += 1
+
+    def _flush_batch(self):
+        if not self._batch:
+            return
+        if self.fmt == 'csv':
+            self._csv_writer.writerows(self._batch)
+        elif self.fmt == 'jsonl':
+            for row in self._batch:
+                self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        else:
+            self._write_parquet(self._batch)
+        if self._file is not None:
+            self._sync()
+        self.count += len(self._batch)
+        self._batch = []
+
+    # Parquetはバッチごとに1つの行グループとして書き込む（pyarrowが必要）
+    def _write_parquet(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(
+            [{name: row.get(name) for name in self.fieldnames} for row in rows],
+            schema=pa.schema([(name, pa.int64() if name == 'index' else pa.string()) for name in self.fieldnames]),
+        )
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+# 書き込み途中のファイルも読めるリーダー
+# 最後の行が途中までしか書かれていない場合は、その行を読み飛ばす
+def read_rows(path):
+    ext = os.path.splitext(path)[1]
+    if ext == '.parquet':
+        return pd.read_parquet(path)  # Parquetは書き込み完了後のみ読める
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if not text.endswith('\n'):
+        text = text[:text.rfind('\n') + 1]  # 書きかけの最終行を除く
+
+    if ext == '.jsonl':
+        rows = []
+        for line in text.splitlines():
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return pd.DataFrame(rows, columns=FIELDNAMES if not rows else None)
+
+    if not text:
+        return pd.DataFrame(columns=FIELDNAMES)
+    return pd.read_csv(io.StringIO(text), dtype={'price': str})
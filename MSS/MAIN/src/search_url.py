@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+from urllib.parse import urlencode, urlparse, parse_qs
+
+from config_loader import project_path
+
+# 絞り込み条件をクリックで設定する代わりに、検索結果ページのURLを直接組み立てる
+# カテゴリー名 → カテゴリーIDの対応は config/category_ids.json にキャッシュする
+# 未登録のカテゴリーは一度だけ画面操作で絞り込み、表示されたURLからIDを覚える
+
+SEARCH_URL = 'https://jp.mercari.com/search'
+
+category_ids_path = project_path('config', 'category_ids.json')
+
+SORT_ORDER = 'created_time:desc'  # 新しい順
+SOLD_STATUS = 'sold_out|trading'  # 売り切れのみ
+
+_lock = threading.Lock()
+_category_ids = None
+
+# キャッシュのキー（「メイン/サブ/サブサブ」）
+def category_key(spec):
+    return '/'.join([spec["main_category"], spec["sub_category"], spec["sub_sub_category"]])
+
+def load_category_ids():
+    global _category_ids
+    with _lock:
+        if _category_ids is None:
+            if os.path.exists(category_ids_path):
+                with open(category_ids_path, 'r', encoding='utf-8') as f:
+                    _category_ids = json.load(f)
+            else:
+                _category_ids = {}
+        return _category_ids
+
+# キャッシュ済みのカテゴリーIDを返す（未登録なら None）
+def lookup_category_id(spec):
+    return load_category_ids().get(category_key(spec))
+
+# 画面操作で絞り込んだ後の検索結果URLからカテゴリーIDを取り出してキャッシュする
+def learn_category_id(spec, current_url):
+    category_id = parse_qs(urlparse(current_url).query).get('category_id', [None])[0]
+    if not category_id:
+        return None
+
+    category_ids = load_category_ids()
+    with _lock:
+        if category_ids.get(category_key(spec)) != category_id:
+            category_ids[category_key(spec)] = category_id
+            with open(category_ids_path, 'w', encoding='utf-8') as f:
+                json.dump(category_ids, f, ensure_ascii=False, indent=4)
+            print(f"カテゴリーIDを保存しました: {category_key(spec)} → {category_id}")
+    return category_id
+
+# 検索結果ページのURLを組み立てる（page は1から数える）
+def build_search_url(keyword, category_id=None, sort_order=SORT_ORDER, status=SOLD_STATUS, page=1):
+    sort, order = sort_order.split(':')
+    params = {'keyword': keyword, 'sort': sort, 'order': order}
+    if status:
+        params['status'] = status
+    if category_id:
+        params['category_id'] = category_id
+    if page > 1:
+        params['page_token'] = f"v1:{page - 1}"
+    return f"{SEARCH_URL}?{urlencode(params)}"
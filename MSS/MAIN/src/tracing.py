@@ -0,0 +1,145 @@
+import json
+import os
+import statistics
+import threading
+import time
+from datetime import datetime
+
+from config_loader import project_path
+
+# 処理時間の計測（スパン）
+# with span('scroll', page=1): ... のように囲んだ区間の開始時刻と所要時間を記録し、
+# 終了時に JSON Lines か Chrome のトレース形式（chrome://tracing や Perfetto で開ける）で保存して、
+# 区間ごとの p50/p95 を表示する
+# 無効のときの span() は何もしない共通のオブジェクトを返すだけなので、計測を残したままでもほぼ遅くならない
+#
+# categories.json の設定
+#   "trace": true で有効にする
+#   "trace_format": "jsonl" / "chrome"
+
+traces_folder = project_path('data', 'traces')
+
+# 無効のときに返す何もしないスパン
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.start, end, self.attrs)
+        return False
+
+    # 区間の途中で分かった情報を追加する（取得した件数など）
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.spans = []  # (名前, 開始, 終了, スレッド番号, 属性)
+        self._origin = time.perf_counter()
+        self._thread_ids = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return _Span(self, name, attrs)
+
+    def record(self, name, start, end, attrs):
+        with self._lock:
+            thread_id = self._thread_ids.setdefault(threading.get_ident(), len(self._thread_ids) + 1)
+            self.spans.append((name, start - self._origin, end - self._origin, thread_id, attrs))
+
+    def enable(self):
+        self.enabled = True
+        self.spans = []
+        self._origin = time.perf_counter()
+
+    # 記録したスパンをファイルに保存する
+    def export(self, path, fmt='jsonl'):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, 'w', encoding='utf-8') as f:
+            if fmt == 'chrome':
+                events = [
+                    {'name': name, 'ph': 'X', 'ts': round(start * 1e6), 'dur': round((end - start) * 1e6),
+                     'pid': os.getpid(), 'tid': thread_id, 'args': attrs}
+                    for name, start, end, thread_id, attrs in spans
+                ]
+                json.dump({'traceEvents': events}, f, ensure_ascii=False, default=str)
+            else:
+                for name, start, end, thread_id, attrs in spans:
+                    record = {'name': name, 'start_ms': round(start * 1000, 3), 'duration_ms': round((end - start) * 1000, 3),
+                              'thread': thread_id, **attrs}
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    # 区間の名前ごとの回数・合計・p50・p95・最大を表示する
+    def print_summary(self):
+        durations = {}
+        with self._lock:
+            for name, start, end, _, _ in self.spans:
+                durations.setdefault(name, []).append((end - start) * 1000)
+        if not durations:
+            return
+        print("---- 区間ごとの所要時間 (ms) ----")
+        print(f"{'区間':<28} {'回数':>6} {'合計':>10} {'p50':>9} {'p95':>9} {'最大':>9}")
+        for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+            values.sort()
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            print(f"{name:<28} {len(values):>6} {sum(values):>10.1f} {statistics.median(values):>9.1f} {p95:>9.1f} {values[-1]:>9.1f}")
+
+tracer = Tracer()
+
+def span(name, **attrs):
+    return tracer.span(name, **attrs)
+
+# WebDriverへのコマンド（要素の検索・ページの読み込み・スクリプトの実行など）をすべてスパンとして記録する
+def instrument_driver(driver):
+    if not tracer.enabled:
+        return driver
+    execute = driver.execute
+
+    def traced_execute(command, params=None):
+        with tracer.span(f"webdriver:{command}"):
+            return execute(command, params)
+    driver.execute = traced_execute  # WebElementの操作も driver.execute を通る
+    return driver
+
+# 設定で有効になっていれば計測を始める
+def start_from_config(config):
+    if config.get("trace", False):
+        tracer.enable()
+
+# 計測していれば、結果を data/traces に保存して集計を表示する
+def finish(config, run_name):
+    if not tracer.enabled:
+        return None
+    fmt = config.get("trace_format", "jsonl")
+    file_name = f"{run_name}_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}{'.json' if fmt == 'chrome' else '.jsonl'}"
+    path = os.path.join(traces_folder, file_name)
+    tracer.export(path, fmt)
+    tracer.print_summary()
+    print(f"計測結果を保存しました: {path}")
+    return path
@@ -0,0 +1,107 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+import threading
+import time
+from tracing import span
+
+# 固定の time.sleep の代わりに、条件が満たされた時点で次に進む待機処理
+# 各待機はステップ名ごとに待ち時間を記録し、置き換え前の固定待機との差を集計できる
+
+DEFAULT_TIMEOUT = 10  # 待機の上限（秒）
+POLL_FREQUENCY = 0.1  # 条件を確認する間隔（秒）
+
+# ステップごとの待ち時間を記録する
+class WaitRecorder:
+    def __init__(self):
+        self.records = []  # (ステップ名, 待ち時間, 条件を満たしたか, 置き換え前の固定待機秒数)
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, met, replaces):
+        with self._lock:
+            self.records.append((step, seconds, met, replaces))
+
+    # ステップごとの待ち時間と、固定待機と比べて短縮できた時間を表示する
+    def print_summary(self):
+        if not self.records:
+            return
+        steps = {}
+        for step, seconds, met, replaces in self.records:
+            total = steps.setdefault(step, {'count': 0, 'waited': 0.0, 'fixed': 0.0, 'timeouts': 0})
+            total['count'] += 1
+            total['waited'] += seconds
+            total['fixed'] += replaces
+            total['timeouts'] += 0 if met else 1
+
+        print("---- 待機時間の集計 ----")
+        waited_sum = fixed_sum = 0.0
+        for step, total in steps.items():
+            waited_sum += total['waited']
+            fixed_sum += total['fixed']
+            print(
+                f"{step}: {total['count']}回 待機 {total['waited']:.2f}秒 "
+                f"(固定待機 {total['fixed']:.0f}秒 / 短縮 {total['fixed'] - total['waited']:.2f}秒"
+                f" / タイムアウト {total['timeouts']}回)"
+            )
+        print(f"合計: 待機 {waited_sum:.2f}秒 / 固定待機 {fixed_sum:.0f}秒 / 短縮 {fixed_sum - waited_sum:.2f}秒")
+
+recorder = WaitRecorder()
+
+# 条件が満たされるまで待つ（満たされなければ timeout 秒で諦めて None を返す）
+# replaces には置き換え前の time.sleep の秒数を指定する（集計用）
+def wait_until(driver, condition, step, timeout=DEFAULT_TIMEOUT, replaces=0):
+    start = time.perf_counter()
+    with span(f"待機:{step}") as wait_span:
+        try:
+            result = WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+        except TimeoutException:
+            result = None
+        wait_span.set(met=result is not None)
+    recorder.record(step, time.perf_counter() - start, result is not None, replaces)
+    return result
+
+# 要素が表示される（clickable=True ならクリックできる）まで待つ
+def wait_for_element(driver, locator, step, clickable=False, timeout=DEFAULT_TIMEOUT, replaces=0):
+    condition = EC.element_to_be_clickable(locator) if clickable else EC.presence_of_element_located(locator)
+    return wait_until(driver, condition, step, timeout, replaces)
+
+# 要素がページから外れる（ページが切り替わる）まで待つ
+def wait_for_staleness(driver, element, step, timeout=DEFAULT_TIMEOUT, replaces=0):
+    return wait_until(driver, EC.staleness_of(element), step, timeout, replaces)
+
+# 要素の数と、前回の確認以降に読み込みが終わった通信の数を1回の呼び出しで返す
+# 通信の記録（Resource Timing）は既定で250件までしか溜まらないため、数えるたびに消して溢れないようにする
+# （消さないと画像の多いページでは件数が増えなくなり、読み込み中でも通信が落ち着いたと判断してしまう）
+GROWTH_SCRIPT = """
+const count = document.querySelectorAll(arguments[0]).length;
+if (document.readyState !== 'complete') return [count, -1];
+const loaded = performance.getEntriesByType('resource').length;
+performance.clearResourceTimings();
+return [count, loaded];
+"""
+
+# 新しい通信が idle_time 秒間発生しなければ True を返す判定（loaded: 前回以降に読み込みが終わった通信の数、-1 は読み込み中）
+def network_idle(idle_time=0.5):
+    state = {'since': None}
+
+    def settled(loaded):
+        now = time.perf_counter()
+        if loaded != 0 or state['since'] is None:
+            state['since'] = now
+            return False
+        return now - state['since'] >= idle_time
+    return settled
+
+# スクロール後に selector の要素の数が previous_count より増えるか、通信が落ち着くまで待つ
+# 増えた場合は新しい数、増えずに落ち着いた場合は False を返す
+def wait_for_count_growth(driver, selector, previous_count, step, idle_time=0.5, timeout=DEFAULT_TIMEOUT, replaces=0):
+    idle = network_idle(idle_time)
+
+    def condition(d):
+        count, loaded = d.execute_script(GROWTH_SCRIPT, selector)
+        if count > previous_count:
+            return count
+        return 'idle' if idle(loaded) else False
+
+    result = wait_until(driver, condition, step, timeout, replaces)
+    return result if isinstance(result, int) else False
@@ -1,119 +1,345 @@
-from flask import Flask, render_template, request, redirect, url_for
-from datetime import datetime
-import csv
-import os
-
-app = Flask(__name__)
-
-# グローバル変数
-active_sessions = {}  # 進行中の勤務セッション（氏名ごとに管理）
-
-# 氏名リストをJSONから読み込む
-def load_employee_names():
-    # ファイルがあるとして簡単にデータをサンプル化
-    return ["佐藤太郎", "田中花子", "山田次郎"]
-
-# CSVファイル名を生成（名前に基づく）
-def get_csv_filename(account_name):
-    return f"{account_name}.csv"
-
-# CSVファイルの既存データを読み込む（その人のファイルのみ）
-def load_existing_data(account_name):
-    filename = get_csv_filename(account_name)
-    data = []
-    if os.path.exists(filename):
-        with open(filename, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                data.append(row)
-    return data
-
-# CSVにセッションデータを保存（行を追加または更新）
-def save_session_data(account_name, session_data):
-    filename = get_csv_filename(account_name)
-    data = load_existing_data(account_name)
-
-    # 該当する行を見つけて更新（退勤と休憩のみ）
-    updated = False
-    for row in data:
-        if row['退勤時刻'] == '':  # 退勤がまだされていない行を見つける
-            row.update(session_data)
-            updated = True
-            break
-
-    if not updated:  # 新しい行として出勤時の情報を追加
-        data.append(session_data)
-
-    # データをCSVに書き戻す
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['氏名', '出勤時刻', '休憩開始', '休憩終了', '退勤時刻', '勤務時間']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-
-# 時間差を計算して勤務時間を取得
-def calculate_work_time(start_time, total_break_seconds=0):
-    end_time = datetime.now()
-    total_work_time = end_time - start_time
-    total_work_seconds = total_work_time.total_seconds() - total_break_seconds
-    hours, remainder = divmod(total_work_seconds, 3600)
-    minutes, _ = divmod(remainder, 60)
-    return f"{int(hours):02}:{int(minutes):02}"
-
-# 打刻処理
-@app.route('/punch', methods=['POST'])
-def punch():
-    global active_sessions
-    name = request.form['name']
-    action = request.form['action']
-    
-    current_time = datetime.now().strftime("%H:%M")
-    
-    # 出勤時（必ず新しい行を作成）
-    if action == '出勤':
-        # 新しい出勤データを作成
-        active_sessions[name] = {
-            '氏名': name,
-            '出勤時刻': current_time,
-            '休憩開始': '',
-            '休憩終了': '',
-            '退勤時刻': '',
-            '勤務時間': ''
-        }
-        save_session_data(name, active_sessions[name])  # 常に新しい行を追加
-
-    # 休憩開始時（同じ行の休憩部分を更新）
-    elif action == '休憩開始' and name in active_sessions:
-        active_sessions[name]['休憩開始'] = current_time
-        save_session_data(name, active_sessions[name])  # 更新のみ
-
-    # 休憩終了時（同じ行の休憩部分を更新）
-    elif action == '休憩終了' and name in active_sessions:
-        active_sessions[name]['休憩終了'] = current_time
-        save_session_data(name, active_sessions[name])  # 更新のみ
-
-    # 退勤時（同じ行に退勤と勤務時間を追加）
-    elif action == '退勤' and name in active_sessions:
-        active_sessions[name]['退勤時刻'] = current_time
-
-        # 勤務時間を計算
-        start_time = datetime.strptime(active_sessions[name]['出勤時刻'], "%H:%M")
-        total_work_time = calculate_work_time(start_time)
-        active_sessions[name]['勤務時間'] = total_work_time
-
-        save_session_data(name, active_sessions[name])  # 更新のみ
-
-        # セッション終了
-        del active_sessions[name]
-    
-    return redirect(url_for('index'))
-
-# トップページ（氏名選択とボタンの表示）
-@app.route('/')
-def index():
-    names = load_employee_names()
-    return render_template('index.html', names=names)
-
-if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+from flask import Flask, render_template, request, redirect, url_for, g, Response, jsonify, make_response, abort
+from datetime import datetime, timezone
+from contextlib import closing
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+from urllib.parse import quote
+from attendance_store import (
+    init_db, get_connection, save_session, load_rows, export_csv, migrate_csv_files,
+    write_transaction, load_open_session, write_session, find_punch, record_punch, TIME_FORMAT,
+    shift_seconds, add_to_totals, ensure_totals, rebuild_totals, load_report, PERIODS, is_valid_period_key,
+)
+
+app = Flask(__name__)
+
+# データベースを準備し、既存の <氏名>.csv を取り込む（取り込み済みなら何もしない）
+# 日・週・月の集計表がまだなければ、これまでの勤務から作る
+init_db()
+with closing(get_connection()) as conn:
+    if migrate_csv_files(conn):
+        rebuild_totals(conn)  # 取り込んだ勤務も集計に含める
+    else:
+        ensure_totals(conn)
+
+# 起動したフォルダに関係なく、app.py と同じフォルダの名簿を読む
+EMPLOYEES_FILE = os.path.join(app.root_path, 'employees.json')
+
+# 氏名リストのキャッシュ（employees.json の更新日時が変わったときだけ読み直す）
+# 読み直したときは中身を書き換えず新しいdictに差し替えるので、ロックなしで読んでも更新日時・ETag・氏名の組み合わせが揃う
+roster = {'mtime': None, 'names': [], 'name_set': frozenset(), 'etag': '', 'last_modified': None}
+roster_lock = threading.Lock()
+
+# 名簿が無い場合、空の名簿として扱うと全員の打刻を拒否してしまうので、
+# 起動時はエラーにし、起動後に消えた場合は警告を出して最後に読んだ名簿を使い続ける
+def load_roster():
+    global roster
+    current = roster
+    try:
+        mtime = os.path.getmtime(EMPLOYEES_FILE)
+    except OSError:
+        if not current['etag']:
+            raise FileNotFoundError(f"名簿が見つかりません: {EMPLOYEES_FILE}")
+        app.logger.warning("名簿が見つからないため、前回読み込んだ名簿を使います: %s", EMPLOYEES_FILE)
+        return current
+    if mtime == current['mtime'] and current['etag']:
+        return current
+
+    with roster_lock:
+        current = roster
+        if mtime != current['mtime'] or not current['etag']:
+            with open(EMPLOYEES_FILE, 'rb') as f:
+                content = f.read()
+            names = json.loads(content.decode('utf-8')).get('employees', [])
+            current = {
+                'mtime': mtime,
+                'names': names,
+                'name_set': frozenset(names),
+                'etag': hashlib.sha1(content).hexdigest(),
+                'last_modified': datetime.fromtimestamp(mtime, timezone.utc),
+            }
+            roster = current
+    return current
+
+load_roster()  # 名簿が無ければここで起動を止める
+
+# 氏名リストをJSONから読み込む
+def load_employee_names():
+    return load_roster()['names']
+
+# 名簿に載っている人か確認する（人数が増えても打刻の処理時間が変わらないように集合で調べる）
+def is_employee(name):
+    return name in load_roster()['name_set']
+
+# リクエストごとにデータベースへ接続する
+def get_db():
+    if 'db' not in g:
+        g.db = get_connection()
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception):
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+# CSVファイル名を生成（名前に基づく）
+def get_csv_filename(account_name):
+    return f"{account_name}.csv"
+
+# ダウンロード用のヘッダー（ヘッダーにはlatin-1の文字しか書けないので、日本語のファイル名はパーセントエンコードする）
+def attachment_header(filename):
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+# 既存データを読み込む（その人のデータのみ、CSVと同じ形式）
+def load_existing_data(account_name):
+    return load_rows(get_db(), account_name)
+
+# セッションデータを保存（退勤していない行を更新、なければ追加）
+def save_session_data(account_name, session_data):
+    save_session(get_db(), account_name, session_data)
+
+# 時間差を計算して勤務時間を取得（休憩時間を差し引く）
+def calculate_work_time(start_time, total_break_seconds=0, end_time=None):
+    end_time = end_time or datetime.now()
+    total_work_time = end_time - start_time
+    total_work_seconds = max(0, total_work_time.total_seconds() - total_break_seconds)
+    hours, remainder = divmod(total_work_seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    return f"{int(hours):02}:{int(minutes):02}"
+
+# 打刻処理
+@app.route('/punch', methods=['POST'])
+def punch():
+    name = request.form['name']
+    action = request.form['action']
+    if not is_employee(name):
+        abort(400, '名簿にない氏名です')
+    apply_punch(name, action, datetime.now())
+    return redirect(url_for('index'))
+
+# 同じ人の打刻を順番に処理するためのロック（氏名ごと）
+punch_locks = {}
+punch_locks_guard = threading.Lock()
+
+def get_punch_lock(name):
+    with punch_locks_guard:
+        return punch_locks.setdefault(name, threading.Lock())
+
+# 打刻を1件処理して、(結果, 処理後のセッションデータ) を返す
+#   結果: 'applied'（反映した） / 'ignored'（出勤していない人の打刻なので無視した） / 'duplicate'（同じ打刻IDを処理済み）
+#         'invalid'（出勤中の勤務の出勤・休憩の時刻より前の休憩・退勤。端末の時刻がずれたオフライン打刻など）
+# セッションは共有のデータベースから毎回読み直すので、再起動後や別のワーカーで出勤した場合も続きから打刻できる
+def apply_punch(name, action, punched_at, punch_id=None):
+    current_time = punched_at.strftime(TIME_FORMAT)
+    conn = get_db()
+
+    # 同じプロセス内は氏名ごとのロックで、プロセス間は書き込みトランザクションで順番に処理する
+    with get_punch_lock(name), write_transaction(conn):
+        # 再送された打刻は二重に数えない
+        if punch_id is not None and find_punch(conn, punch_id):
+            return 'duplicate', load_open_session(conn, name)
+
+        session = load_open_session(conn, name)
+        status = 'applied'
+
+        # 休憩・退勤が出勤中の勤務の最後の打刻より前なら反映しない（勤務時間が負にならないように）
+        if action != '出勤' and session:
+            latest = max(session[key] for key in ['出勤時刻', '休憩開始', '休憩終了'] if session[key])
+            if current_time < latest:  # 日付付きの同じ書式なので文字列のまま比べられる
+                return 'invalid', session
+
+        # 出勤時（必ず新しい行を作成）
+        if action == '出勤':
+            # 新しい出勤データを作成
+            session = {
+                '氏名': name,
+                '出勤時刻': current_time,
+                '休憩開始': '',
+                '休憩終了': '',
+                '退勤時刻': '',
+                '勤務時間': ''
+            }
+
+        # 休憩開始時（同じ行の休憩部分を更新）
+        elif action == '休憩開始' and session:
+            session['休憩開始'] = current_time
+
+        # 休憩終了時（同じ行の休憩部分を更新）
+        elif action == '休憩終了' and session:
+            session['休憩終了'] = current_time
+
+        # 退勤時（同じ行に退勤と勤務時間を追加）
+        elif action == '退勤' and session:
+            session['退勤時刻'] = current_time
+
+            # 勤務時間を計算（休憩時間を差し引く。日付をまたぐ勤務も出勤時刻の日付から計算する）
+            start_time = datetime.strptime(session['出勤時刻'], TIME_FORMAT)
+            work_seconds, break_seconds = shift_seconds(session)
+            total_work_time = calculate_work_time(start_time, break_seconds, end_time=punched_at)
+            session['勤務時間'] = total_work_time
+
+            # 日・週・月の集計に加える（月末の集計時に全件を読み直さなくて済むように）
+            add_to_totals(conn, name, start_time, work_seconds, break_seconds)
+
+        else:
+            status = 'ignored'
+
+        if status == 'applied':
+            write_session(conn, name, session)
+        if punch_id is not None:
+            record_punch(conn, punch_id, name, action, current_time, status)
+    return status, session
+
+# 打刻の種類
+PUNCH_ACTIONS = ['出勤', '休憩開始', '休憩終了', '退勤']
+
+# JSONの打刻1件を検証して処理し、結果をdictで返す
+def apply_json_punch(punch_data):
+    punch_id = punch_data.get('punch_id')
+    name = punch_data.get('name')
+    action = punch_data.get('action')
+    result = {'punch_id': punch_id, 'name': name, 'action': action}
+
+    if not isinstance(name, str) or not isinstance(action, str) or not name or action not in PUNCH_ACTIONS:
+        return {**result, 'status': 'invalid', 'error': 'name と action（出勤・休憩開始・休憩終了・退勤）が必要です'}
+    if not is_employee(name):
+        return {**result, 'status': 'invalid', 'error': '名簿にない氏名です'}
+    try:
+        punched_at = parse_client_timestamp(punch_data.get('timestamp'))
+    except (TypeError, ValueError):  # 数値など文字列でない timestamp も不正な時刻として扱う
+        return {**result, 'status': 'invalid', 'error': 'timestamp はISO 8601形式で指定してください'}
+
+    status, session = apply_punch(name, action, punched_at, None if punch_id is None else str(punch_id))
+    result = {**result, 'status': status, 'on_duty': bool(session) and not session['退勤時刻'], 'session': session}
+    if status == 'invalid':
+        result['error'] = 'timestamp が出勤中の勤務の出勤・休憩の時刻より前です'
+    return result
+
+# 端末側の打刻時刻（ISO 8601）をサーバーの現地時刻に変換する（省略時は受信時刻）
+def parse_client_timestamp(timestamp):
+    if not timestamp:
+        return datetime.now()
+    punched_at = datetime.fromisoformat(timestamp)
+    if punched_at.tzinfo is not None:
+        punched_at = punched_at.astimezone().replace(tzinfo=None)
+    return punched_at
+
+# JSONの打刻API（端末がオフライン中にためた打刻をまとめて送れる）
+# 1件: {"punch_id": "...", "name": "...", "action": "出勤", "timestamp": "2024-11-05T09:00:00+09:00"}
+# 複数: 上記のリスト、または {"punches": [...]}（打刻時刻の順に処理する）
+# 同じ punch_id の打刻は1回だけ反映するので、失敗したバッチをそのまま再送してよい
+@app.route('/api/punch', methods=['POST'])
+def api_punch():
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and 'punches' in payload:
+        payload = payload['punches']
+
+    if isinstance(payload, dict):
+        return jsonify(apply_json_punch(payload))
+    if not isinstance(payload, list) or not all(isinstance(p, dict) for p in payload):
+        return jsonify({'error': '打刻のJSONオブジェクト、またはそのリストを送ってください'}), 400
+
+    # 打刻時刻の順に並べてから処理する（時刻が不正なものは後ろに回して invalid にする）
+    def sort_key(punch_data):
+        try:
+            return (0, parse_client_timestamp(punch_data.get('timestamp')))
+        except (TypeError, ValueError):
+            return (1, datetime.min)
+
+    results = [apply_json_punch(punch_data) for punch_data in sorted(payload, key=sort_key)]
+    return jsonify({'results': results})
+
+# 勤怠データを従来の <氏名>.csv と同じ形式でダウンロードする
+@app.route('/export/<name>.csv')
+def export(name):
+    buffer = io.StringIO()
+    export_csv(get_db(), name, buffer)
+    return Response(
+        buffer.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': attachment_header(get_csv_filename(name))},
+    )
+
+# 集計する期間を (種類, キー) で返す（省略時は今月、書式が違えば 400）
+#   ?month=2024-11 / ?week=2024-W45 / ?day=2024-11-05
+def report_period():
+    for period_type in PERIODS:
+        if request.args.get(period_type):
+            period_key = request.args[period_type]
+            if not is_valid_period_key(period_type, period_key):
+                abort(400)
+            return period_type, period_key
+    return 'month', PERIODS['month'](datetime.now())
+
+# 期間ごとの勤務時間の集計（退勤のたびに更新している集計表を読むだけなので件数が増えても速い）
+@app.route('/api/report')
+def api_report():
+    period_type, period_key = report_period()
+    rows = load_report(get_db(), period_type, period_key)
+    return jsonify({
+        'period': period_type,
+        'key': period_key,
+        'employees': rows,
+        'total_work_seconds': sum(row['work_seconds'] for row in rows),
+    })
+
+# 期間ごとの勤務時間の集計をCSVでダウンロードする
+@app.route('/report.csv')
+def report_csv():
+    period_type, period_key = report_period()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['氏名', '勤務時間', '休憩時間', '勤務回数'])
+    for row in load_report(get_db(), period_type, period_key):
+        writer.writerow([row['氏名'], row['勤務時間'], row['休憩時間'], row['勤務回数']])
+    return Response(
+        buffer.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': attachment_header(f"report_{period_key}.csv")},
+    )
+
+# 氏名の検索（部分一致）とページ分け
+#   /api/employees?q=佐藤&page=1&per_page=50
+@app.route('/api/employees')
+def api_employees():
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+
+    names = load_employee_names()
+    if query:
+        names = [name for name in names if query in name]
+    start = (page - 1) * per_page
+    response = jsonify({
+        'employees': names[start:start + per_page],
+        'total': len(names),
+        'page': page,
+        'per_page': per_page,
+    })
+    response.add_etag()
+    return response.make_conditional(request)
+
+MAX_PER_PAGE = 200
+FIRST_PAGE_SIZE = 50  # トップページに最初から載せる人数（それ以降は検索で探す）
+
+# トップページ（氏名選択とボタンの表示）
+# 名簿が変わっていなければ 304 を返し、端末にページを再ダウンロードさせない
+@app.route('/')
+def index():
+    current = load_roster()
+    names = current['names']
+    template_mtime = os.path.getmtime(os.path.join(app.root_path, app.template_folder, 'index.html'))
+    response = make_response(render_template(
+        'index.html', names=names[:FIRST_PAGE_SIZE], total=len(names), per_page=FIRST_PAGE_SIZE,
+    ))
+    response.set_etag(f"{current['etag']}-{int(template_mtime)}")
+    response.last_modified = max(current['last_modified'], datetime.fromtimestamp(template_mtime, timezone.utc))
+    response.cache_control.no_cache = True  # 毎回 ETag で確認させる
+    return response.make_conditional(request)
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0')
@@ -0,0 +1,317 @@
+import csv
+import glob
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# 勤怠データを保存するSQLiteデータベース
+# 打刻1回につき「出勤中の行を索引で探す → 1行を追加または更新」だけを行い、ファイル全体は書き直さない
+# 時刻は日付付き（YYYY-MM-DD HH:MM）で保存し、CSVに書き出すときは従来通り HH:MM にする
+
+# データベースと取り込む <氏名>.csv は、起動したフォルダに関係なくこのファイルと同じフォルダに置く
+DATA_FOLDER = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(DATA_FOLDER, 'attendance.db')
+
+FIELDNAMES = ['氏名', '出勤時刻', '休憩開始', '休憩終了', '退勤時刻', '勤務時間']
+
+# CSVの列名とデータベースの列名の対応
+COLUMNS = {
+    '氏名': 'name',
+    '出勤時刻': 'clock_in',
+    '休憩開始': 'break_start',
+    '休憩終了': 'break_end',
+    '退勤時刻': 'clock_out',
+    '勤務時間': 'work_time',
+}
+
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    work_date TEXT NOT NULL,
+    clock_in TEXT NOT NULL DEFAULT '',
+    break_start TEXT NOT NULL DEFAULT '',
+    break_end TEXT NOT NULL DEFAULT '',
+    clock_out TEXT NOT NULL DEFAULT '',
+    work_time TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_name_date ON attendance (name, work_date);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_open ON attendance (name) WHERE clock_out = '';
+CREATE TABLE IF NOT EXISTS punches (
+    punch_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    action TEXT NOT NULL,
+    punched_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    received_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS work_totals (
+    name TEXT NOT NULL,
+    period_type TEXT NOT NULL,
+    period_key TEXT NOT NULL,
+    work_seconds INTEGER NOT NULL DEFAULT 0,
+    break_seconds INTEGER NOT NULL DEFAULT 0,
+    shifts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, period_type, period_key)
+);
+CREATE INDEX IF NOT EXISTS idx_work_totals_period ON work_totals (period_type, period_key);
+CREATE TABLE IF NOT EXISTS migrated_files (
+    filename TEXT PRIMARY KEY,
+    migrated_at TEXT NOT NULL
+);
+"""
+
+def get_connection(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")  # 打刻を確実にディスクへ書き込む
+    return conn
+
+def init_db(db_path=DB_PATH):
+    with get_connection(db_path) as conn:
+        conn.executescript(SCHEMA)
+
+# 集計期間ごとのキー（日: 2024-11-05 / 週: 2024-W45 / 月: 2024-11）
+PERIODS = {
+    'day': lambda d: d.strftime('%Y-%m-%d'),
+    'week': lambda d: '%d-W%02d' % d.isocalendar()[:2],
+    'month': lambda d: d.strftime('%Y-%m'),
+}
+
+# キーの読み取り方（週は月曜日の日付として読む）
+PERIOD_PARSERS = {
+    'day': lambda key: datetime.strptime(key, '%Y-%m-%d'),
+    'week': lambda key: datetime.strptime(key + '-1', '%G-W%V-%u'),
+    'month': lambda key: datetime.strptime(key, '%Y-%m'),
+}
+
+# 期間のキーが PERIODS と同じ書式なら True（2024-1 のような書式違いも不正とする）
+def is_valid_period_key(period_type, key):
+    try:
+        return PERIODS[period_type](PERIOD_PARSERS[period_type](key)) == key
+    except (KeyError, ValueError):
+        return False
+
+# 書き込み用のトランザクション
+# 開始時に書き込みロックを取るので、複数のワーカープロセスからの打刻も1件ずつ順番に処理される
+@contextmanager
+def write_transaction(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+# 出勤中（退勤していない）の行をセッションデータ（CSVの列名のdict、日付付きの時刻）として返す
+def load_open_session(conn, account_name):
+    row = conn.execute(
+        "SELECT name, clock_in, break_start, break_end, clock_out, work_time"
+        " FROM attendance WHERE name = ? AND clock_out = ''",
+        (account_name,),
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(FIELDNAMES, row))
+
+# セッションデータを書き込む（トランザクションは呼び出し側で開始しておく）
+# 退勤していない行があればその行を更新し、なければ新しい行として追加する
+def write_session(conn, account_name, session_data):
+    values = {COLUMNS[key]: value for key, value in session_data.items() if key in COLUMNS and key != '氏名'}
+    open_row = conn.execute(
+        "SELECT id FROM attendance WHERE name = ? AND clock_out = ''", (account_name,)
+    ).fetchone()
+    if open_row:
+        assignments = ', '.join(f"{column} = ?" for column in values)
+        conn.execute(f"UPDATE attendance SET {assignments} WHERE id = ?", (*values.values(), open_row[0]))
+    else:
+        work_date = values.get('clock_in', '')[:10] or datetime.now().strftime('%Y-%m-%d')
+        columns = ', '.join(['name', 'work_date', *values])
+        placeholders = ', '.join('?' * (len(values) + 2))
+        conn.execute(
+            f"INSERT INTO attendance ({columns}) VALUES ({placeholders})",
+            (account_name, work_date, *values.values()),
+        )
+
+# 打刻IDで処理済みの打刻を探す（未処理なら None）
+def find_punch(conn, punch_id):
+    return conn.execute("SELECT status FROM punches WHERE punch_id = ?", (punch_id,)).fetchone()
+
+# 処理した打刻を打刻IDと一緒に記録する（同じ打刻の再送を見分けるため）
+def record_punch(conn, punch_id, name, action, punched_at, status):
+    conn.execute(
+        "INSERT INTO punches (punch_id, name, action, punched_at, status, received_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (punch_id, name, action, punched_at, status, datetime.now().strftime(TIME_FORMAT)),
+    )
+
+# セッションデータ（CSVの列名のdict）を保存する
+def save_session(conn, account_name, session_data):
+    with write_transaction(conn):
+        write_session(conn, account_name, session_data)
+
+# その人の勤怠データをCSVと同じ形式（列名・HH:MM）で返す
+def load_rows(conn, account_name):
+    rows = conn.execute(
+        "SELECT name, clock_in, break_start, break_end, clock_out, work_time"
+        " FROM attendance WHERE name = ? ORDER BY work_date, id",
+        (account_name,),
+    ).fetchall()
+    return [to_csv_row(row) for row in rows]
+
+def to_csv_row(row):
+    name, clock_in, break_start, break_end, clock_out, work_time = row
+    return {
+        '氏名': name,
+        '出勤時刻': clock_in[-5:],
+        '休憩開始': break_start[-5:],
+        '休憩終了': break_end[-5:],
+        '退勤時刻': clock_out[-5:],
+        '勤務時間': work_time,
+    }
+
+# 退勤済みのセッションの (勤務秒数, 休憩秒数) を返す
+# 時刻は日付付きなので日付をまたぐ勤務もそのまま計算でき、休憩終了の打刻がなければ退勤までを休憩とみなす
+def shift_seconds(session):
+    clock_in = datetime.strptime(session['出勤時刻'], TIME_FORMAT)
+    clock_out = datetime.strptime(session['退勤時刻'], TIME_FORMAT)
+    break_seconds = 0
+    if session['休憩開始']:
+        break_start = datetime.strptime(session['休憩開始'], TIME_FORMAT)
+        break_end = datetime.strptime(session['休憩終了'], TIME_FORMAT) if session['休憩終了'] else clock_out
+        break_seconds = max(0, int((break_end - break_start).total_seconds()))
+    work_seconds = max(0, int((clock_out - clock_in).total_seconds()) - break_seconds)
+    return work_seconds, break_seconds
+
+# 退勤した勤務を日・週・月の集計に加える（出勤した日の勤務として数える）
+def add_to_totals(conn, account_name, clock_in, work_seconds, break_seconds):
+    for period_type, period_key in PERIODS.items():
+        conn.execute(
+            "INSERT INTO work_totals (name, period_type, period_key, work_seconds, break_seconds, shifts)"
+            " VALUES (?, ?, ?, ?, ?, 1)"
+            " ON CONFLICT (name, period_type, period_key) DO UPDATE SET"
+            " work_seconds = work_seconds + excluded.work_seconds,"
+            " break_seconds = break_seconds + excluded.break_seconds,"
+            " shifts = shifts + 1",
+            (account_name, period_type, period_key(clock_in), work_seconds, break_seconds),
+        )
+
+# 退勤済みの全勤務から集計を作り直す（取り込み直後や集計がまだない場合に使う）
+def rebuild_totals(conn):
+    with write_transaction(conn):
+        conn.execute("DELETE FROM work_totals")
+        rows = conn.execute(
+            "SELECT name, clock_in, break_start, break_end, clock_out, work_time"
+            " FROM attendance WHERE clock_out != '' AND clock_in != ''"
+        ).fetchall()
+        for row in rows:
+            session = dict(zip(FIELDNAMES, row))
+            work_seconds, break_seconds = shift_seconds(session)
+            add_to_totals(conn, session['氏名'], datetime.strptime(session['出勤時刻'], TIME_FORMAT), work_seconds, break_seconds)
+    return len(rows)
+
+# 集計がまだ作られていなければ作る
+def ensure_totals(conn):
+    if conn.execute("SELECT 1 FROM work_totals LIMIT 1").fetchone() is None:
+        rebuild_totals(conn)
+
+# 指定した期間の全員分の集計を返す
+def load_report(conn, period_type, period_key):
+    rows = conn.execute(
+        "SELECT name, work_seconds, break_seconds, shifts FROM work_totals"
+        " WHERE period_type = ? AND period_key = ? ORDER BY name",
+        (period_type, period_key),
+    ).fetchall()
+    return [
+        {'氏名': name, '勤務時間': format_seconds(work), '休憩時間': format_seconds(rest), '勤務回数': shifts,
+         'work_seconds': work, 'break_seconds': rest}
+        for name, work, rest, shifts in rows
+    ]
+
+# 秒数を HH:MM 形式にする
+def format_seconds(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    return f"{hours:02}:{remainder // 60:02}"
+
+# 従来の <氏名>.csv と同じ形式で書き出す
+def export_csv(conn, account_name, f):
+    writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+    writer.writeheader()
+    for row in load_rows(conn, account_name):
+        writer.writerow(row)
+
+# HH:MM の時刻に日付を付ける（基準時刻より前なら翌日とみなす）
+def attach_date(hhmm, base_date, after=None):
+    if not hhmm:
+        return ''
+    value = datetime.combine(base_date, datetime.strptime(hhmm, '%H:%M').time())
+    if after is not None and value < after:
+        value += timedelta(days=1)
+    return value.strftime(TIME_FORMAT)
+
+# 既存の <氏名>.csv をデータベースに取り込む（取り込み済みのファイルは飛ばす）
+# CSVには日付がないため、ファイルの更新日を出勤日とする
+# 複数のワーカーが同時に起動しても二重に取り込まないよう、1ファイルずつ書き込みトランザクション内で確認する
+def migrate_csv_files(conn, folder=DATA_FOLDER):
+    migrated = 0
+    for path in sorted(glob.glob(os.path.join(folder, '*.csv'))):
+        filename = os.path.basename(path)
+        base_date = datetime.fromtimestamp(os.path.getmtime(path)).date()
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        if rows and set(FIELDNAMES) - set(rows[0]):
+            continue  # 勤怠のCSVではない
+
+        try:
+            with write_transaction(conn):
+                if conn.execute("SELECT 1 FROM migrated_files WHERE filename = ?", (filename,)).fetchone():
+                    continue
+                for row in rows:
+                    clock_in = attach_date(row['出勤時刻'], base_date)
+                    start = datetime.strptime(clock_in, TIME_FORMAT) if clock_in else None
+                    conn.execute(
+                        "INSERT INTO attendance (name, work_date, clock_in, break_start, break_end, clock_out, work_time)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            row['氏名'] or os.path.splitext(filename)[0],
+                            base_date.isoformat(),
+                            clock_in,
+                            attach_date(row['休憩開始'], base_date, start),
+                            attach_date(row['休憩終了'], base_date, start),
+                            attach_date(row['退勤時刻'], base_date, start),
+                            row['勤務時間'],
+                        ),
+                    )
+                conn.execute(
+                    "INSERT INTO migrated_files (filename, migrated_at) VALUES (?, ?)",
+                    (filename, datetime.now().strftime(TIME_FORMAT)),
+                )
+        except sqlite3.IntegrityError:
+            # 同じ人の出勤中の行がすでにデータベースにある
+            print(f"取り込めませんでした（出勤中の行が重複しています）: {filename}")
+            continue
+        migrated += 1
+        print(f"取り込みました: {filename}（{len(rows)}行）")
+    return migrated
+
+# 使い方:
+#   python attendance_store.py migrate        既存のCSVを取り込む
+#   python attendance_store.py export <氏名>  CSV形式で標準出力に書き出す
+#   python attendance_store.py rebuild-totals 日・週・月の集計を作り直す
+if __name__ == '__main__':
+    init_db()
+    conn = get_connection()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command == 'migrate':
+        print(f"{migrate_csv_files(conn)}件のファイルを取り込みました。")
+    elif command == 'export' and len(sys.argv) > 2:
+        export_csv(conn, sys.argv[2], sys.stdout)
+    elif command == 'rebuild-totals':
+        print(f"{rebuild_totals(conn)}件の勤務から集計を作り直しました。")
+    else:
+        print("使い方: python attendance_store.py migrate | export <氏名> | rebuild-totals")
+    conn.close()
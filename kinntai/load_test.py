@@ -0,0 +1,188 @@
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+# 打刻サーバーの負荷試験
+# gunicorn のワーカー数を変えながら、同時に打刻したときの処理件数（件/秒）と、
+# 同じ人の打刻が同時に届いても勤務が1回分だけ記録されること（氏名ごとのロックと BEGIN IMMEDIATE）を確認する
+# SQLiteは書き込みを1つずつしか処理しないため、ワーカー数を増やしても件/秒はほとんど伸びない（伸びを測る試験ではない）
+# 使い方: python load_test.py [ワーカー数...]   例: python load_test.py 1 2 4 8
+# 実行には gunicorn が必要（pip install gunicorn）。データは一時フォルダに作るので本番のデータには影響しない
+
+EMPLOYEES = 40  # 打刻する人数（1人につき 出勤→休憩開始→休憩終了→退勤 を繰り返す）
+SHIFTS = 5  # 1人あたりの勤務回数
+CLIENTS = 32  # 同時に打刻する端末の数
+ACTIONS = ['出勤', '休憩開始', '休憩終了', '退勤']
+RACE_NAME = '同時試験'  # 同時に打刻する人（count_closed_shifts の「試験%」に含めないよう「試験」で始めない）
+RACE_CLIENTS = 8  # 同じ人の同じ打刻を同時に送る端末の数
+RACE_ROUNDS = 10  # 同時の出勤 → 同時の退勤 を繰り返す回数
+
+APP_FILES = ['app.py', 'attendance_store.py', 'templates']
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# アプリを一時フォルダにコピーして gunicorn で起動する
+def start_server(workers, workdir, port):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=workdir,
+    )
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("サーバーが起動しませんでした")
+
+# 1人分の打刻をすべて順番に送る（同じ人の打刻は順番通りに届く前提）
+def punch_employee(port, name):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    try:
+        for _ in range(SHIFTS):
+            for action in ACTIONS:
+                body = urlencode({'name': name, 'action': action})
+                start = time.perf_counter()
+                conn.request('POST', '/punch', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+                response = conn.getresponse()
+                response.read()
+                latencies.append(time.perf_counter() - start)
+                if response.status not in (200, 302):
+                    raise RuntimeError(f"{name} {action}: HTTP {response.status}")
+    finally:
+        conn.close()
+    return latencies
+
+def send_punch(conn, name, action):
+    conn.request('POST', '/punch', urlencode({'name': name, 'action': action}), {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    if response.status not in (200, 302):
+        raise RuntimeError(f"{name} {action}: HTTP {response.status}")
+
+# 同じ人の出勤・退勤を RACE_CLIENTS 台の端末から同時に送る（端末ごとに別の接続なので、別のワーカーにも届く）
+def race_same_employee(port):
+    barrier = threading.Barrier(RACE_CLIENTS)
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            for _ in range(RACE_ROUNDS):
+                for action in ['出勤', '退勤']:
+                    barrier.wait()
+                    send_punch(conn, RACE_NAME, action)
+                    barrier.wait()  # 全員が送り終えてから次の打刻へ進む
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(max_workers=RACE_CLIENTS) as executor:
+        for future in [executor.submit(client) for _ in range(RACE_CLIENTS)]:
+            future.result()
+
+# 同時に打刻した人の記録を確認する
+# 正しく順番に処理されていれば、勤務は RACE_ROUNDS 行ですべて退勤済み、集計の勤務回数も RACE_ROUNDS 回になる
+def check_race(workdir):
+    sys.path.insert(0, workdir)
+    from attendance_store import get_connection
+    conn = get_connection(os.path.join(workdir, 'attendance.db'))
+    try:
+        rows, closed = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(clock_out != ''), 0) FROM attendance WHERE name = ?", (RACE_NAME,)
+        ).fetchone()
+        shifts = conn.execute(
+            "SELECT COALESCE(SUM(shifts), 0) FROM work_totals WHERE name = ? AND period_type = 'day'", (RACE_NAME,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+        sys.path.remove(workdir)
+    return rows == closed == shifts == RACE_ROUNDS, f"勤務 {rows}行 / 退勤済み {closed}行 / 集計 {shifts}回"
+
+# 全員の勤務が正しく記録されたか確認する（退勤済みの行が 人数 x 勤務回数 あるか）
+def count_closed_shifts(workdir):
+    sys.path.insert(0, workdir)
+    from attendance_store import get_connection
+    conn = get_connection(os.path.join(workdir, 'attendance.db'))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM attendance WHERE name LIKE '試験%' AND clock_out != ''").fetchone()[0]
+    finally:
+        conn.close()
+        sys.path.remove(workdir)
+
+def run(workers):
+    workdir = tempfile.mkdtemp(prefix='kinntai_load_')
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in APP_FILES:
+        source = os.path.join(here, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workdir, name))
+        else:
+            shutil.copy(source, workdir)
+
+    # 名簿にない氏名の打刻は受け付けないので、試験用の名簿を作る
+    names = [f"試験{i:03}" for i in range(EMPLOYEES)]
+    with open(os.path.join(workdir, 'employees.json'), 'w', encoding='utf-8') as f:
+        json.dump({'employees': names + [RACE_NAME]}, f, ensure_ascii=False)
+
+    port = free_port()
+    process = start_server(workers, workdir, port)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CLIENTS) as executor:
+            latencies = [value for values in executor.map(lambda name: punch_employee(port, name), names) for value in values]
+        elapsed = time.perf_counter() - start
+        race_same_employee(port)
+    finally:
+        process.terminate()
+        process.wait()
+
+    closed = count_closed_shifts(workdir)
+    race_ok, race_detail = check_race(workdir)
+    shutil.rmtree(workdir, ignore_errors=True)
+    latencies.sort()
+    return {
+        'workers': workers,
+        'punches': len(latencies),
+        'per_sec': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'ok': closed == EMPLOYEES * SHIFTS,
+        'race_ok': race_ok,
+        'race_detail': race_detail,
+    }
+
+def main():
+    worker_counts = [int(arg) for arg in sys.argv[1:]] or [1, 2, 4]
+    print(f"{EMPLOYEES}人 x {SHIFTS}勤務 x {len(ACTIONS)}打刻 / 同時接続 {CLIENTS} / CPU {os.cpu_count()}コア")
+    print(f"同時打刻: {RACE_NAME} の出勤・退勤を {RACE_CLIENTS}台から同時に {RACE_ROUNDS}回")
+    print("ワーカー数  打刻数   件/秒   p50(ms)  p95(ms)  記録  同時打刻")
+    failed = False
+    for workers in worker_counts:
+        result = run(workers)
+        failed = failed or not (result['ok'] and result['race_ok'])
+        print(
+            f"{result['workers']:>8}  {result['punches']:>6}  {result['per_sec']:>7.1f}  "
+            f"{result['p50_ms']:>7.1f}  {result['p95_ms']:>7.1f}  {'OK' if result['ok'] else 'NG':>4}  "
+            f"{'OK' if result['race_ok'] else 'NG'}（{result['race_detail']}）"
+        )
+    print("※ SQLiteは書き込みを1つずつ処理するため、ワーカー数を増やしても件/秒はほぼ変わりません。")
+    print("   ワーカーを増やす効果は、書き込み以外（テンプレートの描画など）を並行して処理できる分だけです。")
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()